@@ -0,0 +1,28 @@
+"""
+Request-path hooks installed by FLASK_APP_MUTATOR
+Kept out of superset_config.py so benchmarks/bench_auth.py installs exactly
+the same stack in front of its Flask-AppBuilder app
+"""
+
+
+def init_request_hooks(app, server_side_sessions=True, session_backend=None):
+    """Probes/metrics, template cache, HTTP cache policy, session TTL endpoint and sessions"""
+    # /healthz and /readyz answered in front of sessions/auth, plus request metrics
+    from health import init_health
+    init_health(app)
+
+    # Precompiled Jinja bytecode (populated at image build by template_cache.py)
+    from template_cache import init_template_cache
+    init_template_cache(app)
+
+    # Path-classified Cache-Control policy (immutable assets, no-store auth pages)
+    from http_cache import init_http_cache
+    init_http_cache(app)
+
+    # Read-only /session/ttl/ endpoint used by logout_script() (templates/tail_js_custom_extra.html)
+    from session_monitor import init_session_monitor
+    init_session_monitor(app)
+
+    if server_side_sessions:
+        from session_store import init_server_side_sessions
+        init_server_side_sessions(app, backend=session_backend)
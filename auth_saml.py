@@ -4,7 +4,10 @@ Provides SAML authentication with database fallback capability
 Based on successful GitHub examples for dual authentication
 """
 import os
+import hashlib
 import logging
+import threading
+import time
 from flask import redirect, url_for, flash, request, g, session
 from flask_login import login_user
 from flask_appbuilder.security.views import AuthDBView
@@ -19,15 +22,43 @@ from onelogin.saml2.settings import OneLogin_Saml2_Settings
 from onelogin.saml2.utils import OneLogin_Saml2_Utils
 from werkzeug.wrappers import Response as WerkzeugResponse
 from typing import Optional
+from http_cache import no_store
+import saml_metrics
+from template_cache import install_template_loader
+from saml_provisioning import SamlUserProvisioner, userinfo_from_saml
+from saml_precheck import (
+    SamlBusyError,
+    SamlPrecheckError,
+    precheck_saml_response,
+    verification_limiter,
+)
+from saml_replay import SamlReplayError, allowed_clock_skew, replay_store
 
 logger = logging.getLogger(__name__)
 
+# Only these SAML attributes are kept in the session, the rest of the claims
+# (Azure AD groups/roles can be several KB) are used at login time and dropped
+SAML_SESSION_ATTRIBUTES = [
+    attr.strip() for attr in os.environ.get(
+        'SAML_SESSION_ATTRIBUTES',
+        'http://schemas.xmlsoap.org/ws/2005/05/identity/claims/givenname,'
+        'http://schemas.xmlsoap.org/ws/2005/05/identity/claims/surname'
+    ).split(',') if attr.strip()
+]
 
-def init_saml_auth(req):
-    """Initialize SAML Auth from environment variables"""
-    
-    # Build SAML settings from environment variables
-    settings = {
+
+def _env_or_file(name, default=''):
+    """Read a setting from ``<name>_FILE`` (mounted secret) or the plain env var"""
+    path = os.environ.get(f'{name}_FILE')
+    if path:
+        with open(path) as fh:
+            return fh.read()
+    return os.environ.get(name, default)
+
+
+def build_saml_settings():
+    """Build the python3-saml settings dict from environment variables"""
+    return {
         "strict": os.environ.get('SAML_STRICT', 'true').lower() == 'true',
         "debug": os.environ.get('SAML_DEBUG', 'false').lower() == 'true',
         "sp": {
@@ -41,8 +72,8 @@ def init_saml_auth(req):
                 "binding": "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Redirect"
             },
             "NameIDFormat": os.environ.get('SAML_SP_NAMEID_FORMAT', 'urn:oasis:names:tc:SAML:1.1:nameid-format:emailAddress'),
-            "x509cert": os.environ.get('SAML_SP_X509_CERT', ''),
-            "privateKey": os.environ.get('SAML_SP_PRIVATE_KEY', '')
+            "x509cert": _env_or_file('SAML_SP_X509_CERT'),
+            "privateKey": _env_or_file('SAML_SP_PRIVATE_KEY')
         },
         "idp": {
             "entityId": os.environ.get('SAML_IDP_ENTITY_ID', ''),
@@ -54,7 +85,7 @@ def init_saml_auth(req):
                 "url": os.environ.get('SAML_IDP_SLO_URL', ''),
                 "binding": "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Redirect"
             },
-            "x509cert": os.environ.get('SAML_IDP_X509_CERT', '')
+            "x509cert": _env_or_file('SAML_IDP_X509_CERT')
         },
         # Security settings - balance compatibility with security
         "security": {
@@ -88,9 +119,87 @@ def init_saml_auth(req):
             "clockSkew": 30,  # 30 second tolerance for clock differences
         }
     }
-    
-    auth = OneLogin_Saml2_Auth(req, settings)
-    return auth
+
+
+class SamlSettingsRegistry:
+    """
+    Process-wide cache of the validated OneLogin_Saml2_Settings object.
+
+    Building the settings validates the whole dict and formats the SP/IdP
+    certificates and private key, so it is done once per worker and reused by
+    every login, ACS and logout request. The SAML_* environment and the
+    mtime/size of any mounted ``*_FILE`` secrets are fingerprinted at most
+    every SAML_SETTINGS_RELOAD_INTERVAL seconds; a changed fingerprint builds
+    a new settings object and swaps it in atomically.
+    """
+
+    def __init__(self, reload_interval=None):
+        if reload_interval is None:
+            reload_interval = float(os.environ.get('SAML_SETTINGS_RELOAD_INTERVAL', '30'))
+        self.reload_interval = reload_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        # (fingerprint, settings) tuple so readers always see a consistent pair
+        self._current = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _fingerprint():
+        """Hash the SAML_* environment and the stat of mounted cert/key files"""
+        parts = []
+        for key in sorted(k for k in os.environ if k.startswith('SAML_')):
+            parts.append((key, os.environ[key]))
+            if key.endswith('_FILE'):
+                try:
+                    st = os.stat(os.environ[key])
+                    parts.append((st.st_mtime_ns, st.st_size))
+                except OSError:
+                    parts.append(None)
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def get(self):
+        """Return the current settings object, rebuilding it if the sources changed"""
+        current = self._current
+        now = time.monotonic()
+        if current is not None and now - self._checked_at < self.reload_interval:
+            return current[1]
+
+        fingerprint = self._fingerprint()
+        if current is not None and current[0] == fingerprint:
+            self._checked_at = now
+            return current[1]
+
+        with self._lock:
+            current = self._current
+            if current is not None and current[0] == fingerprint:
+                return current[1]
+            try:
+                settings = OneLogin_Saml2_Settings(build_saml_settings())
+            except Exception as e:
+                if current is None:
+                    raise
+                # Keep serving the last good settings until the sources are fixed
+                logger.error("❌ Invalid SAML settings, keeping version %s: %s", self.version, e)
+                self._checked_at = now
+                return current[1]
+            self._current = (fingerprint, settings)
+            self._checked_at = now
+            self.version += 1
+            logger.info("🔧 Loaded SAML settings version %s", self.version)
+            return settings
+
+    def invalidate(self):
+        """Force a rebuild on the next request"""
+        self._checked_at = 0.0
+        self._current = None
+
+
+saml_settings_registry = SamlSettingsRegistry()
+
+
+def init_saml_auth(req):
+    """Initialize SAML Auth using the cached, pre-validated settings"""
+    return OneLogin_Saml2_Auth(req, saml_settings_registry.get())
 
 
 def prepare_flask_request(request):
@@ -115,9 +224,7 @@ class CustomSamlAuthView(AuthDBView):
     @no_cache
     def login(self):
         """Handle both SAML and database authentication"""
-        logger.info(f"🔍 CustomSamlAuthView.login() called!")
-        logger.info(f"🔍 Request method: {request.method}")
-        logger.info(f"🔍 Request args: {dict(request.args)}")
+        logger.debug("🔍 CustomSamlAuthView.login() called: method=%s args=%s", request.method, request.args)
         
         # If user is already authenticated, redirect to index
         if g.user is not None and g.user.is_authenticated:
@@ -163,8 +270,7 @@ class CustomSamlAuthView(AuthDBView):
     def acs(self):
         """SAML Assertion Consumer Service - CSRF exempt endpoint"""
         logger.info("📥 SAML ACS endpoint called (CSRF exempt)")
-        logger.info(f"🔍 Request method: {request.method}")
-        logger.info(f"🔍 Request form keys: {list(request.form.keys())}")
+        logger.debug("🔍 Request method=%s form keys=%s", request.method, list(request.form.keys()))
         
         if 'SAMLResponse' in request.form:
             return self._handle_saml_response()
@@ -222,7 +328,7 @@ class CustomSamlAuthView(AuthDBView):
             return response
             
         except Exception as e:
-            logger.error(f"❌ SAML logout error: {e}")
+            logger.error("❌ SAML logout error: %s", e)
             # Fallback to local logout if SAML logout fails
             flash('SAML logout failed, performing local logout', 'warning')
             return self._handle_local_logout()
@@ -252,10 +358,11 @@ class CustomSamlAuthView(AuthDBView):
                 return response
             
             # For regular requests, show logout page with client-side cleanup
-            response = self.render_template(
+            from flask import make_response
+            response = make_response(self.render_template(
                 'appbuilder/general/security/logout.html',
                 message='You have been logged out of Superset. Your organization account session remains active.'
-            )
+            ))
             
             # Clear authentication cookies
             self._clear_auth_cookies(response)
@@ -266,7 +373,7 @@ class CustomSamlAuthView(AuthDBView):
             return response
             
         except Exception as e:
-            logger.error(f"❌ Local logout error: {e}")
+            logger.error("❌ Local logout error: %s", e)
             # Force redirect to login even if logout fails
             response = redirect('/login/')
             self._clear_auth_cookies(response)
@@ -291,6 +398,10 @@ class CustomSamlAuthView(AuthDBView):
         superset_keys = ['_flashes', 'csrf_token']
         for key in superset_keys:
             session.pop(key, None)
+        
+        # Server-side sessions: drop the whole record, the cookie is cleared anyway
+        if getattr(session, 'sid', None):
+            session.clear()
     
     def _clear_auth_cookies(self, response):
         """Clear all authentication-related cookies"""
@@ -320,17 +431,8 @@ class CustomSamlAuthView(AuthDBView):
             )
     
     def _add_cache_control_headers(self, response):
-        """Add headers to prevent caching of authenticated content"""
-        logger.info("🚫 Adding cache control headers")
-        
-        # Prevent caching of the logout response
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        
-        # Additional security headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
+        """Mark auth responses as not storable (same policy as http_cache for /login, /logout, /acs)"""
+        no_store(response)
     
     def _handle_saml_login(self):
         """Handle SAML authentication request"""
@@ -343,76 +445,132 @@ class CustomSamlAuthView(AuthDBView):
             
             req = prepare_flask_request(request)
             auth = init_saml_auth(req)
-            return redirect(auth.login())
+            login_url = auth.login()
+            # Any replica may receive the response, so the request ID is shared
+            replay_store().remember_request(auth.get_last_request_id(), allowed_clock_skew(auth.get_settings()))
+            return redirect(login_url)
             
         except Exception as e:
-            logger.error(f"❌ SAML request error: {e}")
+            logger.error("❌ SAML request error: %s", e)
             flash(f"SAML authentication error: {e}", "danger")
             return redirect('/login/')
     
     def _handle_saml_response(self):
         """Handle SAML authentication response"""
+        trace = saml_metrics.trace()
         try:
-            req = prepare_flask_request(request)
-            auth = init_saml_auth(req)
-            auth.process_response()
+            with trace.phase('prepare'):
+                req = prepare_flask_request(request)
+                auth = init_saml_auth(req)
+            
+            # Reject bad payloads before any base64/XML/xmlsec work
+            with trace.phase('precheck'):
+                settings = auth.get_settings()
+                sniffed = precheck_saml_response(
+                    request.form.get('SAMLResponse', ''),
+                    expected_issuer=settings.get_idp_data().get('entityId'),
+                    current_url=OneLogin_Saml2_Utils.get_self_url_no_query(req),
+                    strict=settings.is_strict()
+                )
+            
+            # SP-initiated responses must answer a request some replica issued and nobody answered yet
+            store = replay_store()
+            request_id = sniffed['in_response_to']
+            if request_id:
+                with trace.phase('replay'):
+                    if not store.is_pending_request(request_id):
+                        raise SamlReplayError('unknown_request', f'Unknown or already answered AuthnRequest {request_id}')
+            
+            # Bound concurrent signature verification in this worker
+            with verification_limiter.slot() as waited:
+                trace.record('admission', waited)
+                # base64 decode, XML parse and xmlsec signature verification
+                with trace.phase('process_response'):
+                    auth.process_response(request_id=request_id)
             
             errors = auth.get_errors()
             if len(errors) == 0:
-                session['samlUserdata'] = auth.get_attributes()
-                session['samlNameId'] = auth.get_nameid()
-                session['samlNameIdFormat'] = auth.get_nameid_format()
-                session['samlSessionIndex'] = auth.get_session_index()
+                # Only verified responses consume the request ID and record the assertion ID
+                with trace.phase('replay'):
+                    if request_id and not store.consume_request(request_id):
+                        raise SamlReplayError('request_reused', f'AuthnRequest {request_id} was already answered')
+                    if not store.use_assertion(
+                        auth.get_last_assertion_id(),
+                        auth.get_last_assertion_not_on_or_after(),
+                        allowed_clock_skew(auth.get_settings()),
+                    ):
+                        raise SamlReplayError('assertion_replay', f'Assertion {auth.get_last_assertion_id()} was already used')
+                
+                # Fresh session ID after authentication when sessions are server-side
+                with trace.phase('session'):
+                    if hasattr(session, 'regenerate'):
+                        session.regenerate()
+                    attributes = auth.get_attributes()
+                    session['samlUserdata'] = {
+                        key: attributes[key] for key in SAML_SESSION_ATTRIBUTES if key in attributes
+                    }
+                    session['samlNameId'] = auth.get_nameid()
+                    session['samlNameIdFormat'] = auth.get_nameid_format()
+                    session['samlSessionIndex'] = auth.get_session_index()
                 
                 # Create or update user
-                user = self._auth_user_saml(auth)
+                user = self._auth_user_saml(auth, trace)
                 if user:
-                    logger.info(f"✅ SAML user authenticated: {user.username}")
+                    trace.finish('success', user=user.username)
                     return redirect(self.appbuilder.get_url_for_index)
                 else:
+                    trace.finish('failure', 'provisioning')
                     flash('Could not create user from SAML response', 'danger')
             else:
-                logger.error(f"❌ SAML errors: {auth.get_last_error_reason()}")
+                trace.finish('failure', errors[0], error=auth.get_last_error_reason())
                 flash(f'SAML authentication failed: {auth.get_last_error_reason()}', 'danger')
                 
+        except SamlPrecheckError as e:
+            trace.finish('rejected', e.reason, error=str(e))
+            flash('Invalid SAML response', 'danger')
+        except SamlReplayError as e:
+            logger.warning("🚫 SAML response rejected: %s", e)
+            trace.finish('rejected', e.reason, error=str(e))
+            flash('Invalid SAML response', 'danger')
+        except SamlBusyError as e:
+            trace.finish('busy')
+            return self._saml_busy_response(e.retry_after)
         except Exception as e:
-            logger.error(f"❌ SAML response processing error: {e}")
+            logger.exception("❌ SAML response processing error: %s", e)
+            trace.finish('failure', type(e).__name__, error=str(e))
             flash(f'SAML processing error: {e}', 'danger')
             
         return redirect('/login/')
     
-    def _auth_user_saml(self, saml_auth):
+    def _saml_busy_response(self, retry_after):
+        """Answer 503 with Retry-After when signature verification is saturated"""
+        response = WerkzeugResponse(
+            'Sign-in is busy, please try again in a few seconds.',
+            status=503,
+            mimetype='text/plain'
+        )
+        response.headers['Retry-After'] = str(retry_after)
+        self._add_cache_control_headers(response)
+        return response
+    
+    def _auth_user_saml(self, saml_auth, trace=None):
         """Create or update user from SAML attributes"""
+        trace = trace or saml_metrics.trace()
         try:
-            userdata = saml_auth.get_attributes()
-            nameid = saml_auth.get_nameid()
-            
-            # Extract user information from SAML response
-            email = nameid  # Usually email from Azure AD
-            first_name = userdata.get('http://schemas.xmlsoap.org/ws/2005/05/identity/claims/givenname', [email.split('@')[0]])[0]
-            last_name = userdata.get('http://schemas.xmlsoap.org/ws/2005/05/identity/claims/surname', ['User'])[0]
-            username = email.split('@')[0]  # Use email prefix as username
-            
-            # Find or create user
-            user = self.appbuilder.sm.find_user(email=email)
+            userinfo = userinfo_from_saml(saml_auth.get_attributes(), saml_auth.get_nameid())
+            # User/role lookups and writes in the metadata database
+            with trace.phase('provision'):
+                user = self.appbuilder.sm.saml_provisioner.provision(userinfo)
             if not user:
-                user = self.appbuilder.sm.add_user(
-                    username=username,
-                    first_name=first_name,
-                    last_name=last_name,
-                    email=email,
-                    role=self.appbuilder.sm.find_role(os.environ.get('SAML_DEFAULT_ROLE', 'Gamma'))
-                )
-                logger.info(f"✅ Created new SAML user: {username}")
-            else:
-                logger.info(f"✅ Found existing SAML user: {username}")
-                
+                return None
+            
             # Login the user
-            login_user(user, remember=False)
+            with trace.phase('login_user'):
+                login_user(user, remember=False)
             return user
             
         except Exception as e:
-            logger.error(f"❌ Error authenticating SAML user: {e}")
+            logger.error("❌ Error authenticating SAML user: %s", e)
             return None
 
 
@@ -426,12 +584,15 @@ class SamlSecurityManager(SupersetSecurityManager):
         super(SamlSecurityManager, self).__init__(appbuilder)
         logger.info("🔧 SAML Security Manager initialized with CustomSamlAuthView")
         
-        # Add custom template directory to Jinja2 loader
+        # Per-worker user/role cache and diff-based role sync for SAML logins
+        self.saml_provisioner = SamlUserProvisioner(self)
+        
+        # Add custom template directory to Jinja2 loader (first, resolved, once)
         try:
-            appbuilder.app.jinja_loader.searchpath.append('/app/pythonpath/templates')
+            install_template_loader(appbuilder.app)
             logger.info("✅ Added custom template directory to Jinja2 loader")
         except Exception as e:
-            logger.warning(f"⚠️ Could not add template directory: {e}")
+            logger.warning("⚠️ Could not add template directory: %s", e)
 
 
 # Export for use in superset_config.py
@@ -0,0 +1,336 @@
+"""
+Offline benchmark for the CustomSamlAuthView login, ACS and logout paths
+Builds a minimal Flask-AppBuilder app around the real auth_saml view and
+security-manager plumbing, backed by a SQLite metadata database, with the same
+request hooks FLASK_APP_MUTATOR installs in production (app_hooks.py), points it at
+a throwaway IdP (saml_idp.py) and drives every path through Flask test
+clients from a thread pool. Reports p50/p90/p99 latency and throughput per
+path and compares them with a saved baseline
+
+Run inside the image built from this repository so the same Superset,
+python3-saml and xmlsec builds are measured, e.g.:
+    docker build -t superset-saml-bench .
+    docker run --rm -v "$PWD:/src" -w /src --entrypoint python superset-saml-bench \\
+        benchmarks/bench_auth.py --iterations 500 --concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+SP_ENTITY_ID = 'https://localhost/'
+ACS_URL = 'https://localhost/acs'
+IDP_ENTITY_ID = 'https://idp.bench.invalid/'
+
+
+def configure_saml_env(idp, sp_key, sp_cert, encrypted):
+    """Point auth_saml's env-driven settings at the throwaway IdP"""
+    os.environ.update({
+        'ENABLE_SAML_AUTH': 'true',
+        'SAML_STRICT': 'true',
+        'SAML_SP_ENTITY_ID': SP_ENTITY_ID,
+        'SAML_SP_ACS_URL': ACS_URL,
+        'SAML_SP_SLS_URL': 'https://localhost/logout/',
+        'SAML_SP_X509_CERT': sp_cert,
+        'SAML_SP_PRIVATE_KEY': sp_key,
+        'SAML_IDP_ENTITY_ID': IDP_ENTITY_ID,
+        'SAML_IDP_SSO_URL': 'https://idp.bench.invalid/sso',
+        'SAML_IDP_SLO_URL': 'https://idp.bench.invalid/slo',
+        'SAML_IDP_X509_CERT': idp.cert,
+        'SAML_WANT_ASSERTIONS_ENCRYPTED': 'true' if encrypted else 'false',
+        'SAML_DEFAULT_ROLE': 'Gamma',
+        'SAML_FORCE_LOCAL_LOGOUT': 'true',
+        # The bench app has no Superset metadata DB extension, keep replay IDs in process
+        'SAML_REPLAY_BACKEND': 'memory',
+    })
+
+
+class MemorySessionBackend:
+    """Server-side session records in process, standing in for MySQL/Redis"""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            record = self._records.get(key)
+        if record is None or record[1] <= time.time():
+            return None
+        return record
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._records[key] = (value, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+def create_bench_app(workdir):
+    """Flask-AppBuilder app using CustomSamlAuthView and SamlUserProvisioner on SQLite"""
+    sys.path.insert(0, REPO_ROOT)
+    from flask import Flask
+    from flask_appbuilder import AppBuilder, SQLA
+    from flask_appbuilder.security.sqla.manager import SecurityManager
+
+    from app_hooks import init_request_hooks
+    from auth_saml import CustomSamlAuthView
+    from saml_provisioning import SamlUserProvisioner
+
+    class BenchSecurityManager(SecurityManager):
+        authdbview = CustomSamlAuthView
+
+        def __init__(self, appbuilder):
+            super().__init__(appbuilder)
+            self.saml_provisioner = SamlUserProvisioner(self)
+
+    app = Flask('saml_bench', template_folder=os.path.join(REPO_ROOT, 'templates'))
+    app.config.update(
+        SECRET_KEY='saml-bench-not-secret',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        WTF_CSRF_ENABLED=False,
+        AUTH_TYPE=1,
+        AUTH_USER_REGISTRATION=True,
+        AUTH_USER_REGISTRATION_ROLE='Gamma',
+        AUTH_ROLES_MAPPING={'Gamma': ['Gamma'], 'Alpha': ['Alpha']},
+        AUTH_ROLES_SYNC_AT_LOGIN=True,
+        PERMANENT_SESSION_LIFETIME=3600,
+    )
+    db = SQLA(app)
+    with app.app_context():
+        appbuilder = AppBuilder(app, db.session, security_manager_class=BenchSecurityManager)
+        for role in ('Gamma', 'Alpha'):
+            if not appbuilder.sm.find_role(role):
+                appbuilder.sm.add_role(role)
+    # Health/metrics, template cache, HTTP cache policy, session TTL and server-side sessions
+    init_request_hooks(app, session_backend=MemorySessionBackend())
+    return app
+
+
+def package_versions():
+    """Versions of the packages that decide the numbers, recorded with each run"""
+    from importlib.metadata import PackageNotFoundError, version
+    versions = {}
+    for name in ('apache-superset', 'Flask-AppBuilder', 'Flask', 'SQLAlchemy', 'python3-saml', 'xmlsec', 'lxml'):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_phase(name, jobs, concurrency):
+    """Run ``jobs`` (callables returning (seconds, ok)) on a thread pool"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def run(job):
+        nonlocal errors
+        seconds, ok = job()
+        with lock:
+            latencies.append(seconds)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, jobs))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def timed(call, ok):
+    start = time.perf_counter()
+    response = call()
+    return time.perf_counter() - start, ok(response)
+
+
+def benchmark(app, idp, iterations, concurrency, users, encrypted, warmup):
+    emails = [f'bench.user{i}@bench.invalid' for i in range(users)]
+    groups = ['Gamma']
+
+    def mint(count):
+        return [
+            idp.response(emails[i % users], groups=groups, encrypt=encrypted)
+            for i in range(count)
+        ]
+
+    def acs(client, saml_response):
+        # Success redirects to the index, every failure back to /login/
+        return timed(
+            lambda: client.post('/acs', data={'SAMLResponse': saml_response}),
+            lambda r: r.status_code == 302 and '/login/' not in r.headers.get('Location', ''),
+        )
+
+    # Warm caches (settings registry, templates, provisioner) outside the measurements
+    client = app.test_client()
+    for saml_response in mint(warmup):
+        acs(client, saml_response)
+        client.get('/logout/')
+        client.get('/login/')
+
+    print(f"🔏 Minting {iterations * 2} signed{' + encrypted' if encrypted else ''} responses...", flush=True)
+    acs_responses = mint(iterations)
+    logout_responses = mint(iterations)
+
+    results = [
+        run_phase('GET /login/', [
+            lambda: timed(lambda: app.test_client().get('/login/'), lambda r: r.status_code == 200)
+            for _ in range(iterations)
+        ], concurrency),
+        run_phase('GET /login/?saml=true', [
+            lambda: timed(lambda: app.test_client().get('/login/?saml=true'), lambda r: r.status_code == 302)
+            for _ in range(iterations)
+        ], concurrency),
+        run_phase('POST /acs', [
+            (lambda value=value: acs(app.test_client(), value))
+            for value in acs_responses
+        ], concurrency),
+    ]
+
+    # Log in untimed, then time only the logout
+    logged_in = []
+    for saml_response in logout_responses:
+        client = app.test_client()
+        acs(client, saml_response)
+        logged_in.append(client)
+    results.append(run_phase('GET /logout/', [
+        (lambda client=client: timed(lambda: client.get('/logout/'), lambda r: r.status_code == 200))
+        for client in logged_in
+    ], concurrency))
+    return results
+
+
+def compare(results, baseline):
+    """Print the table, with deltas against the baseline when one exists"""
+    by_path = {row['path']: row for row in (baseline or {}).get('results', [])}
+    header = f"{'path':<24}{'n':>7}{'err':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>10}"
+    if by_path:
+        header += f"{'Δp50':>9}{'Δp99':>9}{'Δreq/s':>9}"
+    print(header)
+    regressions = {}
+    for row in results:
+        line = (
+            f"{row['path']:<24}{row['requests']:>7}{row['errors']:>6}{row['p50_ms']:>10.2f}"
+            f"{row['p90_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}{row['rps']:>10.1f}"
+        )
+        base = by_path.get(row['path'])
+        if base:
+            deltas = {
+                key: (row[key] - base[key]) / base[key] * 100 if base.get(key) else 0.0
+                for key in ('p50_ms', 'p99_ms', 'rps')
+            }
+            regressions[row['path']] = deltas['p99_ms']
+            line += f"{deltas['p50_ms']:>+8.1f}%{deltas['p99_ms']:>+8.1f}%{deltas['rps']:>+8.1f}%"
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200, help='Requests per path')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads')
+    parser.add_argument('--users', type=int, default=50, help='Distinct users cycled through the ACS')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed login/logout cycles first')
+    parser.add_argument('--encrypted', action='store_true', help='Encrypt assertions for the SP certificate')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PCT',
+                        help='Exit 1 when any p99 is more than PCT%% above the baseline')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    parser.add_argument('--log-level', default='WARNING', help='Log level for the app under test')
+    args = parser.parse_args(argv)
+    # Per-request INFO logging would dominate the measurements
+    logging.basicConfig(level=args.log_level.upper())
+
+    sys.path.insert(0, BENCH_DIR)
+    from saml_idp import BenchIdentityProvider, generate_keypair
+
+    workdir = tempfile.mkdtemp(prefix='saml-bench-')
+    try:
+        sp_key, sp_cert = generate_keypair('saml-bench-sp')
+        idp = BenchIdentityProvider(IDP_ENTITY_ID, SP_ENTITY_ID, ACS_URL, sp_cert=sp_cert)
+        configure_saml_env(idp, sp_key, sp_cert, args.encrypted)
+        app = create_bench_app(workdir)
+        results = benchmark(app, idp, args.iterations, args.concurrency, args.users, args.encrypted, args.warmup)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {
+        'settings': {
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'encrypted': args.encrypted,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'packages': package_versions(),
+        },
+        'results': results,
+    }
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        recorded = baseline.get('settings', {})
+        for key in ('iterations', 'concurrency', 'users', 'encrypted', 'packages'):
+            if recorded.get(key) != run['settings'][key]:
+                print(f"⚠️  Baseline was recorded with a different {key} setting: {recorded.get(key)}")
+    regressions = compare(results, baseline)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as fh:
+            json.dump(run, fh, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump(run, fh, indent=2)
+            fh.write('\n')
+        print(f"💾 Saved baseline to {args.baseline}")
+
+    if any(row['errors'] for row in results):
+        print("❌ Some requests failed, see the err column")
+        return 1
+    if args.fail_on_regression is not None:
+        worst = max(regressions.values(), default=0.0)
+        if worst > args.fail_on_regression:
+            print(f"❌ p99 regressed by {worst:.1f}% (limit {args.fail_on_regression}%)")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Throwaway SAML identity provider for the auth benchmarks
+Generates self-signed IdP and SP keypairs and mints signed (optionally
+encrypted) SAML 2.0 responses the way Azure AD shapes them, so the ACS path
+can be exercised end to end without a real IdP
+"""
+import uuid
+import base64
+import datetime
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from lxml import etree
+from onelogin.saml2.constants import OneLogin_Saml2_Constants
+from onelogin.saml2.utils import OneLogin_Saml2_Utils
+
+NS_SAML = 'urn:oasis:names:tc:SAML:2.0:assertion'
+NS_SAMLP = 'urn:oasis:names:tc:SAML:2.0:protocol'
+
+CLAIM_BASE = 'http://schemas.xmlsoap.org/ws/2005/05/identity/claims'
+CLAIM_GROUPS = 'http://schemas.microsoft.com/ws/2008/06/identity/claims/groups'
+
+
+def generate_keypair(common_name, days=2):
+    """(private key PEM, certificate PEM) for a short-lived self-signed cert"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode()
+    return key_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def _instant(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _id():
+    return '_' + uuid.uuid4().hex
+
+
+class BenchIdentityProvider:
+    """Mints SAML responses for one SP, signed with a throwaway IdP key"""
+
+    def __init__(self, entity_id, sp_entity_id, acs_url, sp_cert=None):
+        self.entity_id = entity_id
+        self.sp_entity_id = sp_entity_id
+        self.acs_url = acs_url
+        self.sp_cert = sp_cert
+        self.key, self.cert = generate_keypair('saml-bench-idp')
+
+    def _assertion(self, email, attributes, now, in_response_to):
+        not_after = _instant(now + datetime.timedelta(minutes=5))
+        in_response = f' InResponseTo="{in_response_to}"' if in_response_to else ''
+        values = ''.join(
+            f'<saml:Attribute Name="{name}">'
+            + ''.join(f'<saml:AttributeValue>{value}</saml:AttributeValue>' for value in vals)
+            + '</saml:Attribute>'
+            for name, vals in attributes.items()
+        )
+        return (
+            f'<saml:Assertion xmlns:saml="{NS_SAML}" ID="{_id()}" Version="2.0" IssueInstant="{_instant(now)}">'
+            f'<saml:Issuer>{self.entity_id}</saml:Issuer>'
+            '<saml:Subject>'
+            f'<saml:NameID Format="urn:oasis:names:tc:SAML:1.1:nameid-format:emailAddress">{email}</saml:NameID>'
+            '<saml:SubjectConfirmation Method="urn:oasis:names:tc:SAML:2.0:cm:bearer">'
+            f'<saml:SubjectConfirmationData NotOnOrAfter="{not_after}" Recipient="{self.acs_url}"{in_response}/>'
+            '</saml:SubjectConfirmation>'
+            '</saml:Subject>'
+            f'<saml:Conditions NotBefore="{_instant(now - datetime.timedelta(minutes=1))}" NotOnOrAfter="{not_after}">'
+            f'<saml:AudienceRestriction><saml:Audience>{self.sp_entity_id}</saml:Audience></saml:AudienceRestriction>'
+            '</saml:Conditions>'
+            f'<saml:AuthnStatement AuthnInstant="{_instant(now)}" SessionIndex="{_id()}">'
+            '<saml:AuthnContext><saml:AuthnContextClassRef>'
+            'urn:oasis:names:tc:SAML:2.0:ac:classes:PasswordProtectedTransport'
+            '</saml:AuthnContextClassRef></saml:AuthnContext>'
+            '</saml:AuthnStatement>'
+            f'<saml:AttributeStatement>{values}</saml:AttributeStatement>'
+            '</saml:Assertion>'
+        )
+
+    def _encrypt(self, response_xml):
+        """Replace the signed Assertion with an EncryptedAssertion for the SP cert"""
+        import xmlsec
+
+        root = etree.fromstring(response_xml)
+        assertion = root.find(f'{{{NS_SAML}}}Assertion')
+        wrapper = etree.Element(f'{{{NS_SAML}}}EncryptedAssertion', nsmap={'saml': NS_SAML})
+        assertion.addprevious(wrapper)
+        wrapper.append(assertion)
+
+        enc_data = xmlsec.template.encrypted_data_create(
+            root, xmlsec.constants.TransformAes128Cbc, type=xmlsec.constants.TypeEncElement, ns='xenc'
+        )
+        xmlsec.template.encrypted_data_ensure_cipher_value(enc_data)
+        key_info = xmlsec.template.encrypted_data_ensure_key_info(enc_data, ns='dsig')
+        enc_key = xmlsec.template.add_encrypted_key(key_info, xmlsec.constants.TransformRsaOaep)
+        xmlsec.template.encrypted_data_ensure_cipher_value(enc_key)
+
+        manager = xmlsec.KeysManager()
+        manager.add_key(xmlsec.Key.from_memory(self.sp_cert, xmlsec.constants.KeyDataFormatCertPem, None))
+        ctx = xmlsec.EncryptionContext(manager)
+        ctx.key = xmlsec.Key.generate(xmlsec.constants.KeyDataAes, 128, xmlsec.constants.KeyDataTypeSession)
+        ctx.encrypt_xml(enc_data, assertion)
+        return etree.tostring(root)
+
+    def response(self, email, first_name='Bench', last_name='User', groups=(), in_response_to=None,
+                 encrypt=False):
+        """Base64 SAMLResponse form value with a signed (and optionally encrypted) assertion"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        attributes = {
+            f'{CLAIM_BASE}/givenname': [first_name],
+            f'{CLAIM_BASE}/surname': [last_name],
+            f'{CLAIM_BASE}/emailaddress': [email],
+        }
+        if groups:
+            attributes[CLAIM_GROUPS] = list(groups)
+
+        assertion = OneLogin_Saml2_Utils.add_sign(
+            self._assertion(email, attributes, now, in_response_to),
+            self.key, self.cert,
+            sign_algorithm=OneLogin_Saml2_Constants.RSA_SHA256,
+            digest_algorithm=OneLogin_Saml2_Constants.SHA256,
+        )
+        if isinstance(assertion, bytes):
+            assertion = assertion.decode()
+        if assertion.startswith('<?xml'):
+            assertion = assertion.split('?>', 1)[1]
+
+        in_response = f' InResponseTo="{in_response_to}"' if in_response_to else ''
+        response = (
+            f'<samlp:Response xmlns:samlp="{NS_SAMLP}" xmlns:saml="{NS_SAML}" ID="{_id()}" Version="2.0" '
+            f'IssueInstant="{_instant(now)}" Destination="{self.acs_url}"{in_response}>'
+            f'<saml:Issuer>{self.entity_id}</saml:Issuer>'
+            '<samlp:Status><samlp:StatusCode Value="urn:oasis:names:tc:SAML:2.0:status:Success"/></samlp:Status>'
+            f'{assertion}'
+            '</samlp:Response>'
+        ).encode()
+        if encrypt:
+            response = self._encrypt(response)
+        return base64.b64encode(response).decode('ascii')
@@ -0,0 +1,407 @@
+"""
+Single-process Superset bootstrap for entrypoint.sh
+Waits for the MySQL metadata database with exponential backoff, inspects the
+schema and admin state over one connection and skips `superset db upgrade` /
+`superset init` when the schema fingerprint recorded by the last successful
+bootstrap still matches the installed Superset and config
+
+When several replicas start together, a MySQL advisory lock (GET_LOCK) elects
+one of them to migrate and sync permissions; the others wait for the
+fingerprint row it writes on completion and then start serving
+
+Tables owned by this repo's modules (server-side sessions, the SAML
+request/assertion ID store) are created here
+on every start, so no request pays for DDL
+
+Usage:
+    python bootstrap.py              # wait, then upgrade/initialize if needed
+    python bootstrap.py --wait-only  # only wait for the database (Celery pods)
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import subprocess
+from contextlib import contextmanager
+from importlib import metadata, util
+
+import MySQLdb
+
+STATE_TABLE = 'superset_bootstrap_state'
+REQUIRED_TABLES = ('ab_user', 'dashboards', 'slices', 'alembic_version')
+INIT_MARKER = '/app/superset_home/.superset_initialized'
+PYTHONPATH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DB_WAIT_TIMEOUT = float(os.environ.get('DB_WAIT_TIMEOUT', '60'))
+DB_WAIT_BASE_DELAY = float(os.environ.get('DB_WAIT_BASE_DELAY', '0.5'))
+DB_WAIT_MAX_DELAY = float(os.environ.get('DB_WAIT_MAX_DELAY', '8'))
+# MySQL errors that retrying cannot fix: access denied, unknown database
+FATAL_MYSQL_ERRORS = (1044, 1045, 1049)
+# How long a follower waits for the leader, and how often it re-checks
+BOOTSTRAP_LOCK_TIMEOUT = float(os.environ.get('BOOTSTRAP_LOCK_TIMEOUT', '1800'))
+BOOTSTRAP_LOCK_POLL = int(os.environ.get('BOOTSTRAP_LOCK_POLL', '2'))
+
+timings = []
+
+
+def log(message):
+    print(message, flush=True)
+
+
+@contextmanager
+def phase(name):
+    """Time one bootstrap phase"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        timings.append((name, elapsed))
+        log(f"⏱️  {name}: {elapsed:.2f}s")
+
+
+def connection_params():
+    """MySQLdb.connect() arguments from DB_* or DATABASE_URL"""
+    if all(os.environ.get(key) for key in ('DB_HOST', 'DB_USERNAME', 'DB_PASSWORD', 'DB_DATABASE')):
+        return {
+            'host': os.environ['DB_HOST'],
+            'port': int(os.environ.get('DB_PORT', '3306')),
+            'user': os.environ['DB_USERNAME'],
+            'passwd': os.environ['DB_PASSWORD'],
+            'db': os.environ['DB_DATABASE'],
+        }
+    url = os.environ.get('DATABASE_URL') or os.environ.get('SQLALCHEMY_DATABASE_URI', '')
+    if not url.startswith('mysql'):
+        log("❌ No MySQL configuration found. Set DATABASE_URL or DB_HOST, DB_USERNAME, DB_PASSWORD, DB_DATABASE")
+        sys.exit(1)
+    from sqlalchemy.engine import make_url
+    parsed = make_url(url)
+    return {
+        'host': parsed.host,
+        'port': parsed.port or 3306,
+        'user': parsed.username,
+        'passwd': parsed.password or '',
+        'db': parsed.database,
+    }
+
+
+def wait_for_database(params, timeout=DB_WAIT_TIMEOUT):
+    """Connect with exponential backoff and jitter, giving up after ``timeout`` seconds"""
+    log(f"⏳ Waiting for database {params['user']}@{params['host']}:{params['port']}/{params['db']}...")
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            conn = MySQLdb.connect(connect_timeout=5, **params)
+            conn.autocommit(True)
+            log(f"✅ Database is ready (attempt {attempt})")
+            return conn
+        except MySQLdb.OperationalError as e:
+            if e.args and e.args[0] in FATAL_MYSQL_ERRORS:
+                log(f"❌ Database rejected the connection: {e}")
+                sys.exit(1)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log(f"❌ Database failed to become ready after {timeout:.0f}s: {e}")
+                sys.exit(1)
+            # Equal jitter: at least half the backoff step, so replicas spread out
+            step = min(DB_WAIT_MAX_DELAY, DB_WAIT_BASE_DELAY * 2 ** (attempt - 1))
+            delay = min(remaining, step / 2 + random.uniform(0, step / 2))
+            log(f"⏳ Database not ready yet ({e}), retrying in {delay:.1f}s (attempt {attempt})")
+            time.sleep(delay)
+
+
+def code_fingerprint():
+    """
+    Hash of everything `db upgrade` and `superset init` depend on: the Superset
+    version, its migration scripts and the config/security manager modules
+    """
+    digest = hashlib.sha256()
+    try:
+        digest.update(metadata.version('apache-superset').encode())
+    except metadata.PackageNotFoundError:
+        pass
+    # Locate the package without importing it, importing superset is slow
+    spec = util.find_spec('superset')
+    if spec and spec.submodule_search_locations:
+        versions = os.path.join(list(spec.submodule_search_locations)[0], 'migrations', 'versions')
+        if os.path.isdir(versions):
+            for name in sorted(os.listdir(versions)):
+                if name.endswith('.py'):
+                    digest.update(name.encode())
+    for name in sorted(os.listdir(PYTHONPATH_DIR)):
+        if name.endswith('.py'):
+            digest.update(name.encode())
+            with open(os.path.join(PYTHONPATH_DIR, name), 'rb') as fh:
+                digest.update(fh.read())
+    digest.update(os.environ.get('SUPERSET_BOOTSTRAP_SALT', '').encode())
+    return digest.hexdigest()
+
+
+def inspect_database(conn, admin_username):
+    """Table, admin and recorded-fingerprint state in two round trips"""
+    state = {
+        'tables': set(),
+        'alembic_version': None,
+        'admin_user': False,
+        'admin_role': False,
+        'fingerprint': None,
+        'fingerprint_alembic_version': None,
+    }
+    cursor = conn.cursor()
+    try:
+        names = REQUIRED_TABLES + (STATE_TABLE,)
+        cursor.execute(
+            "SELECT table_name FROM information_schema.tables "
+            f"WHERE table_schema = DATABASE() AND table_name IN ({', '.join(['%s'] * len(names))})",
+            names
+        )
+        state['tables'] = {row[0].lower() for row in cursor.fetchall()}
+        if not set(REQUIRED_TABLES) <= state['tables']:
+            return state
+
+        recorded = "NULL, NULL"
+        if STATE_TABLE in state['tables']:
+            recorded = (
+                f"(SELECT value FROM {STATE_TABLE} WHERE name = 'fingerprint'), "
+                f"(SELECT value FROM {STATE_TABLE} WHERE name = 'alembic_version')"
+            )
+        cursor.execute(
+            "SELECT "
+            "(SELECT version_num FROM alembic_version LIMIT 1), "
+            "(SELECT COUNT(*) FROM ab_user WHERE username = %s), "
+            "(SELECT COUNT(*) FROM ab_user_role ur JOIN ab_role r ON ur.role_id = r.id WHERE r.name = 'Admin'), "
+            f"{recorded}",
+            (admin_username,)
+        )
+        alembic_version, admin_users, admin_roles, fingerprint, fingerprint_alembic = cursor.fetchone()
+        state.update(
+            alembic_version=alembic_version,
+            admin_user=admin_users > 0,
+            admin_role=admin_roles > 0,
+            fingerprint=fingerprint,
+            fingerprint_alembic_version=fingerprint_alembic,
+        )
+        return state
+    finally:
+        cursor.close()
+
+
+def record_state(conn, fingerprint):
+    """Store the fingerprint with the alembic revision it was computed against"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+            " name VARCHAR(64) NOT NULL PRIMARY KEY,"
+            " value VARCHAR(255) NOT NULL,"
+            " updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+            ")"
+        )
+        cursor.execute("SELECT version_num FROM alembic_version LIMIT 1")
+        row = cursor.fetchone()
+        cursor.executemany(
+            f"INSERT INTO {STATE_TABLE} (name, value) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE value = VALUES(value)",
+            [('fingerprint', fingerprint), ('alembic_version', row[0] if row else '')]
+        )
+    finally:
+        cursor.close()
+
+
+def app_tables():
+    """CREATE TABLE statements for the metadata-database features enabled by the env"""
+    statements = []
+    sessions_enabled = os.environ.get('SERVER_SIDE_SESSIONS_ENABLED', 'true').lower() == 'true'
+    if sessions_enabled and os.environ.get('SESSION_STORE_BACKEND', 'mysql').lower() == 'mysql':
+        # session_store.MySQLSessionBackend
+        statements.append(
+            "CREATE TABLE IF NOT EXISTS superset_server_sessions ("
+            " session_id VARCHAR(128) NOT NULL PRIMARY KEY,"
+            " data MEDIUMBLOB NOT NULL,"
+            " expires_at BIGINT NOT NULL,"
+            " KEY ix_superset_server_sessions_expires_at (expires_at)"
+            ")"
+        )
+    saml_enabled = os.environ.get('ENABLE_SAML_AUTH', 'true').lower() == 'true'
+    replay_backend = os.environ.get('SAML_REPLAY_BACKEND', os.environ.get('SESSION_STORE_BACKEND', 'mysql')).lower()
+    if saml_enabled and replay_backend == 'mysql':
+        # saml_replay.MySQLReplayBackend
+        statements.append(
+            "CREATE TABLE IF NOT EXISTS superset_saml_replay ("
+            " id VARCHAR(191) NOT NULL PRIMARY KEY,"
+            " expires_at BIGINT NOT NULL,"
+            " KEY ix_superset_saml_replay_expires_at (expires_at)"
+            ")"
+        )
+    return statements
+
+
+def ensure_app_tables(conn):
+    """Idempotent, safe to run on every replica"""
+    cursor = conn.cursor()
+    try:
+        for statement in app_tables():
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def lock_name(params):
+    # GET_LOCK names are server-wide, scope them to the metadata database
+    return f"superset_bootstrap:{params['db']}"[:64]
+
+
+def get_lock(conn, name, timeout):
+    """True when this connection now holds the advisory lock"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+        return cursor.fetchone()[0] == 1
+    finally:
+        cursor.close()
+
+
+def release_lock(conn, name):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+    finally:
+        cursor.close()
+
+
+def is_current(state, fingerprint):
+    """Schema, admin and the completion marker all match this image"""
+    initialized = set(REQUIRED_TABLES) <= state['tables'] and (state['admin_user'] or state['admin_role'])
+    return (
+        initialized
+        and state['fingerprint'] == fingerprint
+        and state['fingerprint_alembic_version'] == state['alembic_version']
+    )
+
+
+def run_superset(*args, check=True):
+    result = subprocess.run(['superset', *args])
+    if check and result.returncode != 0:
+        log(f"❌ superset {' '.join(args[:2])} failed with exit code {result.returncode}")
+        sys.exit(result.returncode)
+    return result.returncode == 0
+
+
+def initialize(state):
+    """Run the Superset CLI steps that are actually needed"""
+    with phase('superset db upgrade'):
+        run_superset('db', 'upgrade')
+
+    if not (state['admin_user'] or state['admin_role']):
+        with phase('create admin'):
+            created = run_superset(
+                'fab', 'create-admin',
+                '--username', os.environ.get('SUPERSET_ADMIN_USERNAME', 'admin'),
+                '--password', os.environ.get('SUPERSET_ADMIN_PASSWORD', 'admin'),
+                '--firstname', os.environ.get('SUPERSET_ADMIN_FIRST_NAME', 'Super'),
+                '--lastname', os.environ.get('SUPERSET_ADMIN_LAST_NAME', 'Admin'),
+                '--email', os.environ.get('SUPERSET_ADMIN_EMAIL', 'admin@company.com'),
+                check=False
+            )
+            if not created:
+                log("⚠️  Admin user might already exist")
+
+    with phase('superset init'):
+        run_superset('init')
+
+    if os.environ.get('SUPERSET_LOAD_EXAMPLES', 'no').lower() == 'yes':
+        with phase('load examples'):
+            if not run_superset('load-examples', check=False):
+                log("⚠️  Examples might already be loaded")
+
+
+def initialize_once(conn, params, state, fingerprint, admin_username, force=False):
+    """
+    Initialize on exactly one replica. The pod that gets the advisory lock
+    migrates and writes the completion marker; the others poll the marker
+    and take over the lock if the leader dies (MySQL frees it with the
+    leader's connection)
+    """
+    name = lock_name(params)
+    deadline = time.monotonic() + BOOTSTRAP_LOCK_TIMEOUT
+    waited = False
+    while True:
+        if get_lock(conn, name, 0 if not waited else BOOTSTRAP_LOCK_POLL):
+            break
+        if not waited:
+            log(f"⏳ Another replica holds {name}, waiting for it to finish initialization...")
+            waited = True
+        state = inspect_database(conn, admin_username)
+        if is_current(state, fingerprint):
+            log("✅ Initialization completed by another replica")
+            return
+        if time.monotonic() > deadline:
+            log(f"❌ Gave up waiting for initialization after {BOOTSTRAP_LOCK_TIMEOUT:.0f}s")
+            sys.exit(1)
+
+    try:
+        # Another replica may have finished (and released the lock) since the state was
+        # read, even when the lock was free right away
+        state = inspect_database(conn, admin_username)
+        if is_current(state, fingerprint) and (waited or not force):
+            log("✅ Initialization completed by another replica")
+            return
+        if not (set(REQUIRED_TABLES) <= state['tables'] and (state['admin_user'] or state['admin_role'])):
+            missing = sorted(set(REQUIRED_TABLES) - state['tables'])
+            log(f"🔄 First run detected (missing tables: {missing or 'none'}, "
+                f"admin user: {state['admin_user'] or state['admin_role']}), initializing Superset...")
+        elif force and not waited:
+            log("🔄 SUPERSET_FORCE_INIT set, upgrading and re-initializing Superset...")
+        else:
+            log("🔄 Superset version or config changed since the last bootstrap, upgrading...")
+        initialize(state)
+        with phase('record state'):
+            record_state(conn, fingerprint)
+    finally:
+        release_lock(conn, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--wait-only', action='store_true', help='Only wait for the database')
+    args = parser.parse_args(argv)
+    started = time.monotonic()
+
+    params = connection_params()
+    with phase('wait for database'):
+        conn = wait_for_database(params)
+
+    try:
+        if args.wait_only:
+            return 0
+
+        admin_username = os.environ.get('SUPERSET_ADMIN_USERNAME', 'admin')
+        with phase('inspect database'):
+            state = inspect_database(conn, admin_username)
+            fingerprint = code_fingerprint()
+
+        force = os.environ.get('SUPERSET_FORCE_INIT', 'false').lower() == 'true'
+        if is_current(state, fingerprint) and not force:
+            log("✅ Superset schema and permissions are current, skipping upgrade and init")
+        else:
+            with phase('initialization'):
+                initialize_once(conn, params, state, fingerprint, admin_username, force)
+
+        with phase('app tables'):
+            ensure_app_tables(conn)
+
+        os.makedirs(os.path.dirname(INIT_MARKER), exist_ok=True)
+        open(INIT_MARKER, 'a').close()
+    finally:
+        conn.close()
+        summary = ', '.join(f"{name} {elapsed:.2f}s" for name, elapsed in timings)
+        log(f"⏱️  Bootstrap finished in {time.monotonic() - started:.2f}s ({summary})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
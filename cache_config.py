@@ -0,0 +1,201 @@
+"""
+Multi-tier cache backend and env-driven cache configuration for Superset
+A bounded per-worker LRU (L1) sits in front of a shared Redis-compatible
+store (L2) for CACHE_CONFIG, DATA_CACHE_CONFIG, THUMBNAIL_CACHE_CONFIG and,
+when Redis is configured, FILTER_STATE/EXPLORE_FORM_DATA caches
+
+Without CACHE_REDIS_URL the L2 uses CELERY_BROKER_URL, because Celery workers
+hand async chart results to the web pods through these caches. With neither
+set it falls back to an in-process SimpleCache, the local stand-in for
+development and tests (nothing is shared between workers or replicas)
+"""
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+from flask_caching.backends.base import BaseCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_REDIS_URL = (
+    os.environ.get('CACHE_REDIS_URL')
+    or os.environ.get('REDIS_URL')
+    or os.environ.get('CELERY_BROKER_URL', '')
+)
+
+# Every TieredCache created by Flask-Caching, by tier name, for cache_stats()
+_caches = {}
+
+
+class TieredCache(BaseCache):
+    """
+    Flask-Caching backend with an in-process L1 in front of a shared L2.
+
+    L1 entries are stored pickled, like Redis does, so callers never share
+    mutable objects and the L1 can be bounded by bytes as well as entries.
+    L1 entries live at most ``l1_ttl`` seconds, which bounds how long a worker
+    can serve a value that another replica has already deleted.
+    """
+
+    def __init__(self, l2, name='cache', l1_max_entries=256, l1_max_bytes=64 * 1024 * 1024,
+                 l1_ttl=60, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.l2 = l2
+        self.name = name
+        self.l1_max_entries = l1_max_entries
+        self.l1_max_bytes = l1_max_bytes
+        self.l1_ttl = l1_ttl
+        self._l1 = OrderedDict()  # key -> (expires_at, payload)
+        self._l1_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'sets': 0, 'l1_evictions': 0}
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        from flask_caching.backends import RedisCache, SimpleCache
+        kwargs = dict(kwargs)
+        options = {
+            key: kwargs.pop(key)
+            for key in ('name', 'l1_max_entries', 'l1_max_bytes', 'l1_ttl')
+            if key in kwargs
+        }
+        if config.get('CACHE_REDIS_URL'):
+            l2 = RedisCache.factory(app, config, list(args), dict(kwargs))
+        else:
+            l2 = SimpleCache.factory(app, config, list(args), dict(kwargs))
+        cache = cls(l2, default_timeout=kwargs.get('default_timeout', 300), **options)
+        _caches[cache.name] = cache
+        return cache
+
+    def _l1_ttl_for(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return self.l1_ttl if timeout <= 0 else min(self.l1_ttl, timeout)
+
+    def _l1_get(self, key, count_hit=False):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._l1_drop(key)
+                return None
+            self._l1.move_to_end(key)
+            if count_hit:
+                self.stats['l1_hits'] += 1
+            return entry[1]
+
+    def _count(self, name):
+        # Counters share the L1 lock: gunicorn threads would otherwise lose increments
+        with self._lock:
+            self.stats[name] += 1
+
+    def _l1_drop(self, key):
+        entry = self._l1.pop(key, None)
+        if entry is not None:
+            self._l1_bytes -= len(entry[1])
+
+    def _l1_set(self, key, value, timeout):
+        if self.l1_max_entries <= 0 or self.l1_ttl <= 0:
+            return
+        try:
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(payload) > self.l1_max_bytes:
+            return
+        expires_at = time.monotonic() + self._l1_ttl_for(timeout)
+        with self._lock:
+            self._l1_drop(key)
+            self._l1[key] = (expires_at, payload)
+            self._l1_bytes += len(payload)
+            while len(self._l1) > self.l1_max_entries or self._l1_bytes > self.l1_max_bytes:
+                oldest = next(iter(self._l1))
+                self._l1_drop(oldest)
+                self.stats['l1_evictions'] += 1
+
+    def get(self, key):
+        payload = self._l1_get(key, count_hit=True)
+        if payload is not None:
+            return pickle.loads(payload)
+        value = self.l2.get(key)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('l2_hits')
+        self._l1_set(key, value, None)
+        return value
+
+    def set(self, key, value, timeout=None):
+        self._count('sets')
+        result = self.l2.set(key, value, timeout=timeout)
+        self._l1_set(key, value, timeout)
+        return result
+
+    def add(self, key, value, timeout=None):
+        result = self.l2.add(key, value, timeout=timeout)
+        if result:
+            self._l1_set(key, value, timeout)
+        return result
+
+    def delete(self, key):
+        with self._lock:
+            self._l1_drop(key)
+        return self.l2.delete(key)
+
+    def has(self, key):
+        return self._l1_get(key) is not None or self.l2.has(key)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._l1_bytes = 0
+        return self.l2.clear()
+
+    def inc(self, key, delta=1):
+        with self._lock:
+            self._l1_drop(key)
+        return self.l2.inc(key, delta=delta)
+
+    def dec(self, key, delta=1):
+        with self._lock:
+            self._l1_drop(key)
+        return self.l2.dec(key, delta=delta)
+
+    def snapshot(self):
+        """Counters plus current L1 occupancy"""
+        with self._lock:
+            stats = dict(self.stats, l1_entries=len(self._l1), l1_bytes=self._l1_bytes)
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['l1_hits'] + stats['l2_hits']) / lookups, 4) if lookups else None
+        return stats
+
+
+def cache_stats():
+    """Hit/miss counters of every tiered cache in this worker"""
+    return {name: cache.snapshot() for name, cache in _caches.items()}
+
+
+def build_cache_config(name, env_prefix, key_prefix, default_timeout, l1_max_entries=256,
+                       l1_max_bytes=64 * 1024 * 1024, l1_ttl=60):
+    """
+    Flask-Caching config dict for one Superset cache, overridable per cache with
+    <env_prefix>_TIMEOUT, _KEY_PREFIX, _L1_MAX_ENTRIES, _L1_MAX_BYTES and _L1_TTL
+    """
+    def env(suffix, default):
+        return os.environ.get(f'{env_prefix}_{suffix}', default)
+
+    return {
+        'CACHE_TYPE': 'cache_config.TieredCache',
+        'CACHE_DEFAULT_TIMEOUT': int(env('TIMEOUT', default_timeout)),
+        'CACHE_KEY_PREFIX': env('KEY_PREFIX', key_prefix),
+        'CACHE_REDIS_URL': CACHE_REDIS_URL,
+        'CACHE_OPTIONS': {
+            'name': name,
+            'l1_max_entries': int(env('L1_MAX_ENTRIES', l1_max_entries)),
+            'l1_max_bytes': int(env('L1_MAX_BYTES', l1_max_bytes)),
+            'l1_ttl': float(env('L1_TTL', l1_ttl)),
+        },
+    }
@@ -0,0 +1,235 @@
+"""
+Log-driven chart cache warm-up for Superset
+Ranks dashboards and charts by their activity in Superset's own ``logs``
+table over a recent window, then runs the charts' query contexts through a
+bounded thread pool into the data cache (DATA_CACHE_CONFIG), within a time
+budget and a start-rate limit, and reports the coverage it reached
+
+Usage:
+    superset cache-warmup --dry-run                 # show what would be warmed
+    superset cache-warmup --days 7 --budget 600     # warm the busiest charts
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, text
+
+WARMUP_LOCK_PREFIX = 'superset_cache_warmup'
+
+
+def mine_activity(session, since, top_dashboards, top_charts):
+    """
+    Chart candidates ranked by logged activity since ``since``
+    Returns ({chart_id: {'views', 'dashboard_id', 'dashboard_views'}}, total chart events in the window)
+    """
+    dashboards = session.execute(text(
+        "SELECT dashboard_id, COUNT(*) AS views FROM logs "
+        "WHERE dttm >= :since AND dashboard_id IS NOT NULL "
+        "GROUP BY dashboard_id ORDER BY views DESC LIMIT :limit"
+    ), {'since': since, 'limit': top_dashboards}).fetchall()
+    charts = session.execute(text(
+        "SELECT slice_id, COUNT(*) AS views FROM logs "
+        "WHERE dttm >= :since AND slice_id IS NOT NULL "
+        "GROUP BY slice_id ORDER BY views DESC LIMIT :limit"
+    ), {'since': since, 'limit': top_charts}).fetchall()
+    total = session.execute(text(
+        "SELECT COUNT(*) FROM logs WHERE dttm >= :since AND slice_id IS NOT NULL"
+    ), {'since': since}).scalar() or 0
+
+    candidates = {
+        chart_id: {'views': views, 'dashboard_id': None, 'dashboard_views': 0}
+        for chart_id, views in charts
+    }
+    if dashboards:
+        dashboard_views = dict(dashboards)
+        members = session.execute(text(
+            "SELECT dashboard_id, slice_id FROM dashboard_slices WHERE dashboard_id IN :ids"
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': list(dashboard_views)}).fetchall()
+        for dashboard_id, chart_id in members:
+            entry = candidates.setdefault(chart_id, {'views': 0, 'dashboard_id': None, 'dashboard_views': 0})
+            # Warm in the context of the busiest dashboard showing the chart
+            if dashboard_views[dashboard_id] > entry['dashboard_views']:
+                entry['dashboard_id'] = dashboard_id
+                entry['dashboard_views'] = dashboard_views[dashboard_id]
+    return candidates, total
+
+
+def rank(candidates, limit):
+    """Chart ids by own activity, then by the activity of their dashboard"""
+    ordered = sorted(
+        candidates.items(),
+        key=lambda item: (item[1]['views'], item[1]['dashboard_views']),
+        reverse=True,
+    )
+    return ordered[:limit]
+
+
+class RateLimiter:
+    """Spaces task starts at least ``1 / rate`` seconds apart across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline):
+        """Wait for the next slot; False if it falls after ``deadline``"""
+        with self.lock:
+            slot = max(self.next_at, time.monotonic())
+            if slot >= deadline:
+                return False
+            self.next_at = slot + self.interval
+        time.sleep(max(0.0, slot - time.monotonic()))
+        return True
+
+
+def warm_chart(app, username, chart_id, dashboard_id):
+    """Run one chart's query context with force=True, as ``username``"""
+    from superset import db, security_manager
+    from superset.commands.chart.warm_up_cache import ChartWarmUpCacheCommand
+    from superset.utils.core import override_user
+
+    with app.app_context():
+        try:
+            user = security_manager.find_user(username=username)
+            with override_user(user):
+                result = ChartWarmUpCacheCommand(chart_id, dashboard_id, None).run()
+            return result.get('viz_error')
+        finally:
+            db.session.remove()
+
+
+def acquire_warmup_lock(engine):
+    """
+    MySQL advisory lock so only one replica warms at a time
+    Returns the connection holding it, None when another replica has it
+    """
+    if engine.dialect.name != 'mysql':
+        return engine.connect()
+    conn = engine.connect()
+    name = f"{WARMUP_LOCK_PREFIX}:{engine.url.database}"
+    if conn.execute(text("SELECT GET_LOCK(:name, 0)"), {'name': name}).scalar() == 1:
+        conn.info['warmup_lock'] = name
+        return conn
+    conn.close()
+    return None
+
+
+def release_warmup_lock(conn):
+    name = conn.info.pop('warmup_lock', None)
+    if name:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': name})
+    conn.close()
+
+
+@click.command('cache-warmup')
+@click.option('--days', default=7, show_default=True, envvar='CACHE_WARMUP_WINDOW_DAYS', help='Activity window')
+@click.option('--top-dashboards', default=20, show_default=True, envvar='CACHE_WARMUP_TOP_DASHBOARDS',
+              help='Busiest dashboards whose charts are all warmed')
+@click.option('--top-charts', default=100, show_default=True, envvar='CACHE_WARMUP_TOP_CHARTS',
+              help='Busiest individual charts')
+@click.option('--max-charts', default=200, show_default=True, envvar='CACHE_WARMUP_MAX_CHARTS',
+              help='Upper bound on charts warmed per run')
+@click.option('--concurrency', default=4, show_default=True, envvar='CACHE_WARMUP_CONCURRENCY',
+              help='Charts queried in parallel')
+@click.option('--rate', default=2.0, show_default=True, envvar='CACHE_WARMUP_RATE',
+              help='Max chart queries started per second (0 = unlimited)')
+@click.option('--budget', default=600, show_default=True, envvar='CACHE_WARMUP_BUDGET',
+              help='Seconds after which no new chart query is started')
+@click.option('--user', 'username', envvar='CACHE_WARMUP_USER', help='User the queries run as (default: admin user)')
+@click.option('--lock/--no-lock', default=True, show_default=True, help='Skip if another replica is warming')
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help='Write the coverage report as JSON')
+@click.option('--dry-run', is_flag=True, help='Only list the charts that would be warmed')
+@with_appcontext
+def cache_warmup_command(days, top_dashboards, top_charts, max_charts, concurrency, rate, budget,
+                         username, lock, report_path, dry_run):
+    """Warm the chart data cache for the most-viewed dashboards and charts"""
+    from superset import db
+
+    app = current_app._get_current_object()
+    username = username or os.environ.get('SUPERSET_ADMIN_USERNAME', 'admin')
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+    lock_conn = None
+    if lock and not dry_run:
+        lock_conn = acquire_warmup_lock(db.engine)
+        if lock_conn is None:
+            click.echo("⏭️  Another replica is already warming the cache, skipping")
+            return
+    try:
+        candidates, total_views = mine_activity(db.session, since, top_dashboards, top_charts)
+        db.session.remove()
+        selected = rank(candidates, max_charts)
+        click.echo(
+            f"📊 {len(candidates)} candidate charts from the last {days} days "
+            f"({total_views} chart events), warming up to {len(selected)}"
+        )
+        if dry_run:
+            for chart_id, entry in selected:
+                click.echo(f"  chart {chart_id}: {entry['views']} views (dashboard {entry['dashboard_id']})")
+            return
+
+        results = {}
+        started = time.monotonic()
+        deadline = started + budget
+        limiter = RateLimiter(rate)
+        pending = iter(selected)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='cache-warmup') as pool:
+            while True:
+                # Keep at most ``concurrency`` queries queued or running
+                while len(in_flight) < concurrency:
+                    chart = next(pending, None)
+                    if chart is None or not limiter.acquire(deadline):
+                        pending = iter(())
+                        break
+                    chart_id, entry = chart
+                    future = pool.submit(warm_chart, app, username, chart_id, entry['dashboard_id'])
+                    in_flight[future] = (chart_id, time.monotonic())
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chart_id, submitted = in_flight.pop(future)
+                    try:
+                        error = future.result()
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    results[chart_id] = {'error': error, 'seconds': round(time.monotonic() - submitted, 3)}
+                    if error:
+                        click.echo(f"  ⚠️  chart {chart_id}: {error}")
+        elapsed = time.monotonic() - started
+
+        warmed = [chart_id for chart_id, result in results.items() if not result['error']]
+        warmed_views = sum(candidates[chart_id]['views'] for chart_id in warmed)
+        report = {
+            'window_days': days,
+            'candidates': len(candidates),
+            'selected': len(selected),
+            'attempted': len(results),
+            'warmed': len(warmed),
+            'failed': len(results) - len(warmed),
+            'skipped_budget': len(selected) - len(results),
+            'chart_event_coverage': round(warmed_views / total_views, 4) if total_views else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'charts': {str(chart_id): result for chart_id, result in results.items()},
+        }
+        coverage = report['chart_event_coverage']
+        click.echo(
+            f"✅ Warmed {report['warmed']}/{report['selected']} charts in {elapsed:.1f}s "
+            f"({report['failed']} failed, {report['skipped_budget']} left when the budget ran out); "
+            f"coverage of chart activity: {'n/a' if coverage is None else f'{coverage:.1%}'}"
+        )
+        if report_path:
+            with open(report_path, 'w') as fh:
+                json.dump(report, fh, indent=2)
+    finally:
+        if lock_conn is not None:
+            release_warmup_lock(lock_conn)
@@ -0,0 +1,205 @@
+"""
+ClickHouse connection profile for Superset's clickhouse-connect databases
+Applied through DB_CONNECTION_MUTATOR: every clickhousedb engine shares one
+urllib3 pool per worker process (keep-alive instead of a new TCP/TLS
+connection per chart query), uses LZ4/zstd transport compression and gets
+ClickHouse query settings layered by query source (chart, dashboard,
+SQL Lab) and the user's Superset roles. Requests through the shared pool
+are counted, timed and their X-ClickHouse-Summary totals recorded
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CLICKHOUSE_DIALECTS = ('clickhousedb', 'clickhouse+connect', 'clickhousedb+connect')
+
+CLICKHOUSE_PROFILE_ENABLED = os.environ.get('CLICKHOUSE_PROFILE_ENABLED', 'true').lower() == 'true'
+# lz4 (cheapest CPU), zstd (smallest transfer), gzip or none
+CLICKHOUSE_COMPRESSION = os.environ.get('CLICKHOUSE_COMPRESSION', 'lz4').lower()
+# One connection per server thread by default, like the metadata DB pool
+CLICKHOUSE_POOL_MAXSIZE = int(
+    os.environ.get('CLICKHOUSE_POOL_MAXSIZE') or os.environ.get('SERVER_THREADS_AMOUNT') or '20'
+)
+CLICKHOUSE_POOL_NUM_POOLS = int(os.environ.get('CLICKHOUSE_POOL_NUM_POOLS', '4'))
+CLICKHOUSE_CONNECT_TIMEOUT = int(os.environ.get('CLICKHOUSE_CONNECT_TIMEOUT', '10'))
+CLICKHOUSE_SEND_RECEIVE_TIMEOUT = int(os.environ.get('CLICKHOUSE_SEND_RECEIVE_TIMEOUT', '300'))
+
+# ClickHouse settings: base, then by query source, then by Superset role (in listed order)
+CLICKHOUSE_SETTINGS = json.loads(os.environ.get('CLICKHOUSE_SETTINGS', '{}'))
+CLICKHOUSE_SOURCE_SETTINGS = json.loads(os.environ.get('CLICKHOUSE_SOURCE_SETTINGS', json.dumps({
+    'chart': {'max_execution_time': 60, 'max_threads': 4},
+    'dashboard': {'max_execution_time': 60, 'max_threads': 4},
+    'sql_lab': {'max_execution_time': 300, 'max_threads': 8},
+})))
+CLICKHOUSE_ROLE_SETTINGS = json.loads(os.environ.get('CLICKHOUSE_ROLE_SETTINGS', '{}'))
+
+# TLS options that only a client-owned pool can honour
+_CLIENT_TLS_ARGS = ('ca_cert', 'client_cert', 'client_cert_key', 'verify', 'http_proxy', 'https_proxy')
+
+_stats_lock = threading.Lock()
+_stats = {
+    'requests': 0,
+    'errors': 0,
+    'wait_total_ms': 0.0,
+    'wait_max_ms': 0.0,
+    'read_rows': 0,
+    'read_bytes': 0,
+    'result_rows': 0,
+    'result_bytes': 0,
+}
+_manager = None
+_manager_pid = None
+_manager_lock = threading.Lock()
+
+
+def _record(elapsed_ms, summary=None, error=False):
+    with _stats_lock:
+        _stats['requests'] += 1
+        if error:
+            _stats['errors'] += 1
+            return
+        _stats['wait_total_ms'] += elapsed_ms
+        _stats['wait_max_ms'] = max(_stats['wait_max_ms'], elapsed_ms)
+        for key in ('read_rows', 'read_bytes', 'result_rows', 'result_bytes'):
+            try:
+                _stats[key] += int((summary or {}).get(key, 0))
+            except (TypeError, ValueError):
+                pass
+
+
+def _instrumented_manager_class():
+    from urllib3 import PoolManager
+
+    class InstrumentedPoolManager(PoolManager):
+        """PoolManager that times requests up to the response headers"""
+
+        def urlopen(self, method, url, redirect=True, **kw):
+            start = time.perf_counter()
+            try:
+                response = super().urlopen(method, url, redirect=redirect, **kw)
+            except Exception:
+                _record(0.0, error=True)
+                raise
+            summary = None
+            header = response.headers.get('X-ClickHouse-Summary')
+            if header:
+                try:
+                    summary = json.loads(header)
+                except ValueError:
+                    pass
+            _record((time.perf_counter() - start) * 1000, summary, error=response.status >= 400)
+            return response
+
+    return InstrumentedPoolManager
+
+
+def pool_manager():
+    """This process's shared pool, recreated after fork (gunicorn preload_app)"""
+    global _manager, _manager_pid
+    pid = os.getpid()
+    if _manager is not None and _manager_pid == pid:
+        return _manager
+    with _manager_lock:
+        if _manager is None or _manager_pid != pid:
+            from clickhouse_connect.driver import httputil
+
+            options = {'maxsize': CLICKHOUSE_POOL_MAXSIZE, 'num_pools': CLICKHOUSE_POOL_NUM_POOLS, 'block': False}
+            # Same TCP keep-alive and TLS defaults clickhouse-connect uses for its own pools
+            if hasattr(httputil, 'get_pool_manager_options'):
+                options = httputil.get_pool_manager_options(**options)
+            _manager = _instrumented_manager_class()(**options)
+            _manager_pid = pid
+            logger.info(
+                "✅ ClickHouse HTTP pool: %s connections x %s hosts, compression=%s",
+                CLICKHOUSE_POOL_MAXSIZE, CLICKHOUSE_POOL_NUM_POOLS, CLICKHOUSE_COMPRESSION,
+            )
+    return _manager
+
+
+def _source_name(source):
+    name = getattr(source, 'name', source)
+    return str(name).lower() if name is not None else None
+
+
+def _user_roles(username):
+    """Role names of the requesting user when it is the logged-in user (no extra query)"""
+    try:
+        from flask import g
+        user = getattr(g, 'user', None)
+    except RuntimeError:
+        return []
+    if user is None or getattr(user, 'username', None) != username:
+        return []
+    return [role.name for role in getattr(user, 'roles', None) or []]
+
+
+def query_settings(source=None, roles=()):
+    """ClickHouse settings for a query from ``source`` run by a user with ``roles``"""
+    settings = dict(CLICKHOUSE_SETTINGS)
+    settings.update(CLICKHOUSE_SOURCE_SETTINGS.get(_source_name(source) or '', {}))
+    for role, role_settings in CLICKHOUSE_ROLE_SETTINGS.items():
+        if role in roles:
+            settings.update(role_settings)
+    return settings
+
+
+def mutate_connection(uri, params, username, security_manager, source):
+    """DB_CONNECTION_MUTATOR body: leaves non-ClickHouse engines untouched"""
+    if not CLICKHOUSE_PROFILE_ENABLED or uri.drivername not in CLICKHOUSE_DIALECTS:
+        return uri, params
+
+    connect_args = params.setdefault('connect_args', {})
+    # Values from the database's own engine_params win over the profile
+    if CLICKHOUSE_COMPRESSION != 'none':
+        connect_args.setdefault('compress', CLICKHOUSE_COMPRESSION)
+    connect_args.setdefault('connect_timeout', CLICKHOUSE_CONNECT_TIMEOUT)
+    connect_args.setdefault('send_receive_timeout', CLICKHOUSE_SEND_RECEIVE_TIMEOUT)
+    if not any(arg in connect_args or arg in uri.query for arg in _CLIENT_TLS_ARGS):
+        connect_args.setdefault('pool_mgr', pool_manager())
+
+    settings = query_settings(source, _user_roles(username))
+    settings.update(connect_args.get('settings') or {})
+    if settings:
+        connect_args['settings'] = settings
+    return uri, params
+
+
+def configure_client_defaults():
+    """
+    Process-wide clickhouse-connect defaults: no per-client session id, since
+    pooled connections are used from many threads and ClickHouse rejects
+    concurrent queries in one session
+    """
+    try:
+        from clickhouse_connect import common
+    except ImportError:
+        return
+    common.set_setting('autogenerate_session_id', False)
+
+
+def clickhouse_stats():
+    """Request/transfer counters and per-host pool usage for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['wait_avg_ms'] = round(stats['wait_total_ms'] / stats['requests'], 2) if stats['requests'] else 0.0
+    stats['pid'] = os.getpid()
+    pools = []
+    manager = _manager if _manager_pid == os.getpid() else None
+    if manager is not None:
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'maxsize': CLICKHOUSE_POOL_MAXSIZE,
+                'idle': pool.pool.qsize() if pool.pool is not None else 0,
+                'connections_created': pool.num_connections,
+                'requests': pool.num_requests,
+            })
+    stats['pools'] = pools
+    return stats
@@ -0,0 +1,206 @@
+"""
+Instrumented, env-tunable SQLAlchemy pool for the Superset metadata database
+Sizes the pool from the gunicorn concurrency settings, replaces the
+ping-on-every-checkout of pool_pre_ping with a ping only for connections
+that sat idle, and records checkout wait, usage, overflow and invalidations
+
+Usage (image build):
+    python db_pool.py    # check that engine.dispose() keeps one set of listeners
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import weakref
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Connections idle for longer than this are pinged on checkout
+SQLALCHEMY_POOL_PING_AFTER = float(os.environ.get('SQLALCHEMY_POOL_PING_AFTER', '30'))
+# Checkouts slower than this are logged as a sign of pool starvation
+SQLALCHEMY_POOL_SLOW_CHECKOUT_MS = float(os.environ.get('SQLALCHEMY_POOL_SLOW_CHECKOUT_MS', '250'))
+
+_pools = weakref.WeakSet()
+
+
+_LISTENERS = ('connect', 'checkout', 'checkin', 'invalidate', 'soft_invalidate')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that tracks checkout wait time and connection lifecycle events.
+
+    engine.dispose() (gunicorn post_fork) replaces the pool through recreate(),
+    which hands the old pool's event dispatch to the new one. The listeners are
+    therefore registered once per engine, the counters carry over to the new
+    pool, and only the current pool is reported by pool_stats()
+    """
+
+    def __init__(self, *args, **kwargs):
+        inherited = kwargs.get('_dispatch') is not None
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'checkouts': 0,
+            'checkout_wait_total_ms': 0.0,
+            'checkout_wait_max_ms': 0.0,
+            'slow_checkouts': 0,
+            'checkout_timeouts': 0,
+            'connections_created': 0,
+            'invalidations': 0,
+            'soft_invalidations': 0,
+            'idle_pings': 0,
+        }
+        if not inherited:
+            for name in _LISTENERS:
+                event.listen(self, name, getattr(self, f'_on_{name}'))
+        _pools.add(self)
+
+    def recreate(self):
+        pool = super().recreate()
+        # The inherited listeners are bound to the first pool, share its counters
+        pool._stats_lock, pool.stats = self._stats_lock, self.stats
+        _pools.discard(self)
+        return pool
+
+    def _incr(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self._incr('checkout_timeouts')
+            logger.error("❌ Metadata DB pool exhausted: %s", self.status())
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self.stats['checkouts'] += 1
+                self.stats['checkout_wait_total_ms'] += waited_ms
+                if waited_ms > self.stats['checkout_wait_max_ms']:
+                    self.stats['checkout_wait_max_ms'] = waited_ms
+                if waited_ms > SQLALCHEMY_POOL_SLOW_CHECKOUT_MS:
+                    self.stats['slow_checkouts'] += 1
+            if waited_ms > SQLALCHEMY_POOL_SLOW_CHECKOUT_MS:
+                logger.warning("⏳ Metadata DB checkout took %.0fms (%s)", waited_ms, self.status())
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._incr('connections_created')
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        last_checkin = connection_record.info.get('last_checkin')
+        if last_checkin is None or time.monotonic() - last_checkin < SQLALCHEMY_POOL_PING_AFTER:
+            return
+        self._incr('idle_pings')
+        try:
+            if hasattr(dbapi_connection, 'ping'):
+                dbapi_connection.ping()
+            else:
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute('SELECT 1')
+                finally:
+                    cursor.close()
+        except Exception:
+            # The pool discards this connection and retries the checkout with a fresh one
+            raise exc.DisconnectionError()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info['last_checkin'] = time.monotonic()
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._incr('invalidations')
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        self._incr('soft_invalidations')
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update(
+            pool_size=self.size(),
+            checked_out=self.checkedout(),
+            checked_in=self.checkedin(),
+            overflow=max(0, self.overflow()),
+            max_overflow=self._max_overflow,
+        )
+        stats['checkout_wait_avg_ms'] = (
+            round(stats['checkout_wait_total_ms'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        )
+        return stats
+
+
+def pool_stats():
+    """Snapshot of every instrumented pool in this process"""
+    return [pool.snapshot() for pool in list(_pools)]
+
+
+def build_engine_options():
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the metadata database.
+
+    Defaults to one connection per gunicorn thread (SERVER_THREADS_AMOUNT) plus
+    a small overflow. With SQLALCHEMY_MAX_CONNECTIONS set (the share of MySQL
+    max_connections Superset may use) the per-process pool is capped at
+    budget / (SERVER_WORKER_AMOUNT x SUPERSET_MAX_REPLICAS).
+    """
+    threads = int(os.environ.get('SERVER_THREADS_AMOUNT', '20'))
+    workers = int(os.environ.get('SERVER_WORKER_AMOUNT', '1'))
+    replicas = int(os.environ.get('SUPERSET_MAX_REPLICAS', '1'))
+
+    pool_size = int(os.environ.get('SQLALCHEMY_POOL_SIZE', str(threads)))
+    max_overflow = int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', str(max(2, pool_size // 4))))
+    budget = os.environ.get('SQLALCHEMY_MAX_CONNECTIONS')
+    if budget:
+        per_process = max(1, int(budget) // max(1, workers * replicas))
+        pool_size = min(pool_size, per_process)
+        max_overflow = max(0, min(max_overflow, per_process - pool_size))
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': float(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', '300')),
+        # Replaced by the idle-only ping in InstrumentedQueuePool
+        'pool_pre_ping': os.environ.get('SQLALCHEMY_POOL_PRE_PING', 'false').lower() == 'true',
+        'echo': False,
+    }
+
+
+def check_dispose():
+    """One pool and one listener per event after engine.dispose(), on SQLite"""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine('sqlite://', poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    engine.dispose(close=False)
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+    # SQLAlchemy adds its own connect listeners, count only ours
+    listeners = {
+        name: sum(
+            1 for fn in getattr(engine.pool.dispatch, name)
+            if getattr(fn, '__func__', None) is getattr(InstrumentedQueuePool, f'_on_{name}')
+        )
+        for name in _LISTENERS
+    }
+    pools = pool_stats()
+    if any(count != 1 for count in listeners.values()) or len(pools) != 1 or pools[0]['checkouts'] != 2:
+        print(f"❌ Pool instrumentation duplicated after dispose: listeners={listeners}, pools={pools}")
+        return 1
+    print("✅ Pool instrumentation survives engine.dispose() without duplicates")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(check_dispose())
@@ -0,0 +1,173 @@
+"""
+Batch guest-token API for embedded dashboards
+POST /api/v1/security/guest_token/batch/ mints guest tokens for several
+dashboards in one call, checking the caller's can_grant_guest_token
+permission once instead of once per embed. Like the single endpoint it runs
+GUEST_TOKEN_VALIDATOR_HOOK on every token body before minting. Tokens are
+cached in the shared Superset cache by (user, resources, RLS) until shortly
+before they expire, and resolved embedded dashboards are remembered per
+worker for a few seconds so bursts of batches skip the lookups
+
+Request body (same user/resources/rls shapes as /api/v1/security/guest_token/):
+    {"user": {...}, "resources": [{"type": "dashboard", "id": "<uuid>"}, ...],
+     "rls": [...], "per_resource": true}
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+
+from flask import current_app, request
+from flask_appbuilder.api import BaseApi, expose, protect, safe
+from marshmallow import ValidationError
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Cached tokens are handed out only while they have at least this long left
+GUEST_TOKEN_CACHE_MARGIN = int(os.environ.get('GUEST_TOKEN_CACHE_MARGIN', '60'))
+# Kept short: a de-embedded dashboard gets no new tokens once this runs out
+GUEST_TOKEN_RESOLVE_TTL = float(os.environ.get('GUEST_TOKEN_RESOLVE_TTL', '5'))
+GUEST_TOKEN_BATCH_MAX = int(os.environ.get('GUEST_TOKEN_BATCH_MAX', '50'))
+CACHE_KEY_PREFIX = 'guest_token:'
+
+# Dashboard resource ids known to exist, per worker
+_resolved = TTLCache(GUEST_TOKEN_RESOLVE_TTL, maxsize=5000)
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def token_cache_key(user, resources, rls):
+    """Stable key for the same user, resources and RLS rules in any order"""
+    payload = _canonical([
+        user,
+        sorted((_canonical(r) for r in resources)),
+        sorted((_canonical(r) for r in rls)),
+    ])
+    return CACHE_KEY_PREFIX + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def resolve_dashboards(resource_ids):
+    """
+    Validate dashboard resource ids: embedded UUIDs in one query, anything
+    else (dashboard id or slug) through Superset's own check
+    """
+    from superset import security_manager
+    from superset.extensions import db
+    from superset.models.embedded_dashboard import EmbeddedDashboard
+
+    missing = [rid for rid in dict.fromkeys(resource_ids) if _resolved.get(rid) is None]
+    if not missing:
+        return
+
+    uuids = {}
+    for rid in missing:
+        try:
+            uuids[uuid.UUID(rid)] = rid
+        except ValueError:
+            pass
+    if uuids:
+        found = db.session.query(EmbeddedDashboard.uuid).filter(EmbeddedDashboard.uuid.in_(list(uuids)))
+        for (embedded_uuid,) in found:
+            rid = uuids.get(embedded_uuid if isinstance(embedded_uuid, uuid.UUID) else uuid.UUID(str(embedded_uuid)))
+            if rid is not None:
+                _resolved.set(rid, True)
+
+    for rid in missing:
+        if _resolved.get(rid) is None:
+            # Raises EmbeddedDashboardNotFoundError for unknown dashboards
+            security_manager.validate_guest_token_resources([{'type': 'dashboard', 'id': rid}])
+            _resolved.set(rid, True)
+
+
+def mint(user, resources, rls):
+    """(token, expires_at, cached) for one token, reusing a cached one when possible"""
+    from superset import security_manager
+    from superset.extensions import cache_manager
+
+    cache = cache_manager.cache
+    key = token_cache_key(user, resources, rls)
+    entry = cache.get(key)
+    now = time.time()
+    if entry and entry['expires_at'] - now > GUEST_TOKEN_CACHE_MARGIN:
+        return entry['token'], entry['expires_at'], True
+
+    token = security_manager.create_guest_access_token(user, resources, rls)
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    expires_at = now + current_app.config['GUEST_TOKEN_JWT_EXP_SECONDS']
+    timeout = int(expires_at - now - GUEST_TOKEN_CACHE_MARGIN)
+    if timeout > 0:
+        cache.set(key, {'token': token, 'expires_at': expires_at}, timeout=timeout)
+    return token, expires_at, False
+
+
+class GuestTokenBatchApi(BaseApi):
+    """Mint guest tokens for many embedded dashboards in one request"""
+
+    route_base = '/api/v1/security/guest_token/batch'
+    # Same permission as Superset's single guest-token endpoint
+    class_permission_name = 'SecurityRestApi'
+    method_permission_name = {'batch': 'grant_guest_token'}
+    allow_browser_login = True
+    openapi_spec_tag = 'Security'
+
+    @expose('/', methods=('POST',))
+    @protect()
+    @safe
+    def batch(self):
+        """Guest tokens for a set of dashboards, one per dashboard or one for all"""
+        from superset.commands.dashboard.embedded.exceptions import EmbeddedDashboardNotFoundError
+        from superset.security.api import GuestTokenCreateSchema
+
+        body = request.json or {}
+        per_resource = bool(body.pop('per_resource', True))
+        try:
+            payload = GuestTokenCreateSchema().load(body)
+        except ValidationError as error:
+            return self.response_400(message=error.messages)
+
+        user, rls = payload['user'], payload.get('rls') or []
+        # Enum or plain value depending on the schema version
+        resources = [
+            dict(resource, type=getattr(resource['type'], 'value', resource['type']))
+            for resource in payload['resources']
+        ]
+        if not resources or len(resources) > GUEST_TOKEN_BATCH_MAX:
+            return self.response_400(message=f"Between 1 and {GUEST_TOKEN_BATCH_MAX} resources are required")
+        try:
+            resolve_dashboards([str(r['id']) for r in resources if r['type'] == 'dashboard'])
+        except EmbeddedDashboardNotFoundError as error:
+            return self.response_400(message=error.message)
+
+        groups = [[resource] for resource in resources] if per_resource else [resources]
+        # Same policy hook as Superset's single guest-token endpoint, checked before anything is minted
+        validator = current_app.config.get('GUEST_TOKEN_VALIDATOR_HOOK')
+        if validator is not None:
+            if not callable(validator):
+                return self.response_500(message="Guest token validator hook not callable")
+            for group in groups:
+                if not validator({'user': user, 'resources': group, 'rls': rls}):
+                    return self.response_400(message="Guest token validation failed")
+
+        tokens, minted = [], 0
+        for group in groups:
+            token, expires_at, cached = mint(user, group, rls)
+            minted += not cached
+            tokens.append({
+                'resources': group,
+                'token': token,
+                'expires_at': int(expires_at),
+                'cached': cached,
+            })
+        logger.debug("🎟️ Guest token batch: %s tokens, %s minted", len(tokens), minted)
+        return self.response(200, tokens=tokens)
+
+
+def init_guest_token_api(appbuilder):
+    appbuilder.add_api(GuestTokenBatchApi)
@@ -0,0 +1,144 @@
+"""
+Gunicorn configuration for SERVER_MODE=autotune
+Derives workers and threads from the container's cgroup CPU/memory limits
+(and the HPA memory target when the chart passes it), preloads the app so
+Superset, auth_saml and the SAML/xmlsec libraries are imported once and
+shared copy-on-write, and recycles workers with jittered max-requests
+
+Every value can be overridden with the same env vars run-server.sh uses
+(SERVER_WORKER_AMOUNT, SERVER_THREADS_AMOUNT, GUNICORN_TIMEOUT, ...)
+
+Usage:
+    gunicorn --config /app/pythonpath/gunicorn_config.py "superset.app:create_app()"
+"""
+import os
+import math
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpus():
+    """CPU quota in cores from cgroup v2 cpu.max (v1 fallback), else the affinity mask"""
+    quota = _read(os.path.join(CGROUP_ROOT, 'cpu.max'))
+    if quota:
+        limit, _, period = quota.partition(' ')
+        if limit != 'max':
+            return int(limit) / int(period or 100000)
+    else:
+        limit = _read(os.path.join(CGROUP_ROOT, 'cpu', 'cpu.cfs_quota_us'))
+        period = _read(os.path.join(CGROUP_ROOT, 'cpu', 'cpu.cfs_period_us'))
+        if limit and period and int(limit) > 0:
+            return int(limit) / int(period)
+    try:
+        return float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return float(os.cpu_count() or 1)
+
+
+def cgroup_memory_bytes():
+    """Memory limit from cgroup v2 memory.max (v1 fallback), None when unlimited"""
+    limit = _read(os.path.join(CGROUP_ROOT, 'memory.max'))
+    if limit is None:
+        limit = _read(os.path.join(CGROUP_ROOT, 'memory', 'memory.limit_in_bytes'))
+    if not limit or limit == 'max':
+        return None
+    limit = int(limit)
+    # cgroup v1 reports "unlimited" as a huge page-aligned number
+    return None if limit >= 1 << 60 else limit
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def autotune():
+    """(workers, threads, details) from cgroup limits and GUNICORN_* sizing env"""
+    cpus = cgroup_cpus()
+    memory = cgroup_memory_bytes()
+
+    workers_per_cpu = float(os.environ.get('GUNICORN_WORKERS_PER_CPU', '1'))
+    cpu_workers = max(1, math.ceil(cpus * workers_per_cpu))
+
+    # Keep steady-state memory under the HPA target so adding workers does not
+    # by itself trigger a scale-out (GUNICORN_MEMORY_REQUEST_BYTES comes from
+    # the pod's memory request via the downward API)
+    budget = memory
+    request = _env_int('GUNICORN_MEMORY_REQUEST_BYTES', 0)
+    target = _env_int('GUNICORN_MEMORY_TARGET_PERCENT', 0)
+    if request and target:
+        budget = min(budget or request, request * target // 100)
+    mem_workers = None
+    if budget:
+        worker_mb = _env_int('GUNICORN_WORKER_MEMORY_MB', 400)
+        reserve_mb = _env_int('GUNICORN_MEMORY_RESERVE_MB', 300)
+        mem_workers = max(1, (budget // (1024 * 1024) - reserve_mb) // worker_mb)
+
+    workers = min(cpu_workers, mem_workers or cpu_workers, _env_int('GUNICORN_MAX_WORKERS', 8))
+    # Superset requests mostly wait on the metadata DB and ClickHouse, so each
+    # worker gets enough threads to keep its core busy
+    threads = _env_int('GUNICORN_THREADS_PER_WORKER', max(4, math.ceil(cpus * 8 / workers)))
+    details = {
+        'cpus': round(cpus, 2),
+        'memory_mb': memory // (1024 * 1024) if memory else None,
+        'cpu_workers': cpu_workers,
+        'memory_workers': mem_workers,
+    }
+    return workers, threads, details
+
+
+_workers, _threads, _details = autotune()
+
+bind = f"{os.environ.get('SUPERSET_BIND_ADDRESS', '0.0.0.0')}:{os.environ.get('SUPERSET_PORT', '8088')}"
+workers = _env_int('SERVER_WORKER_AMOUNT', _workers)
+worker_class = os.environ.get('SERVER_WORKER_CLASS', 'gthread')
+threads = _env_int('SERVER_THREADS_AMOUNT', _threads)
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+max_requests = _env_int('WORKER_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('WORKER_MAX_REQUESTS_JITTER', max_requests // 10)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+limit_request_line = _env_int('SERVER_LIMIT_REQUEST_LINE', 0)
+limit_request_field_size = _env_int('SERVER_LIMIT_REQUEST_FIELD_SIZE', 0)
+accesslog = os.environ.get('ACCESS_LOG_FILE', '-')
+errorlog = os.environ.get('ERROR_LOG_FILE', '-')
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+# Pool sizing (db_pool.py) and SAML admission control (saml_precheck.py) read
+# these, export the tuned values before the app is imported
+os.environ['SERVER_WORKER_AMOUNT'] = str(workers)
+os.environ['SERVER_THREADS_AMOUNT'] = str(threads)
+
+
+def on_starting(server):
+    server.log.info(
+        "⚙️  Autotuned gunicorn: %s workers x %s threads (%s), preload=%s, max_requests=%s±%s, limits=%s",
+        workers, threads, worker_class, preload_app, max_requests, max_requests_jitter, _details
+    )
+
+
+# Metrics port and dead-worker cleanup, shared with SERVER_MODE=stock
+from gunicorn_hooks import child_exit, when_ready
+
+
+def post_fork(server, worker):
+    """Give each worker its own metadata DB connections instead of the master's"""
+    app = getattr(server.app, 'callable', None)
+    if app is None or not hasattr(app, 'app_context'):
+        return
+    try:
+        from superset.extensions import db
+        with app.app_context():
+            # close=False leaves the master's sockets alone, the worker just drops its references
+            db.engine.dispose(close=False)
+    except Exception as e:
+        server.log.warning("⚠️ Could not reset DB pool after fork: %s", e)
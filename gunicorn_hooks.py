@@ -0,0 +1,39 @@
+"""
+Gunicorn server hooks for both SERVER_MODEs
+Loaded as the config file in SERVER_MODE=stock (entrypoint.sh puts it in
+GUNICORN_CMD_ARGS, run-server.sh keeps passing every other setting) and
+imported by gunicorn_config.py in SERVER_MODE=autotune
+
+The master serves the Prometheus metrics aggregated over all workers on
+METRICS_PORT, which is not the public port, and drops the live gauges of
+workers that exit (timeouts, max-requests recycling, crashes)
+"""
+import os
+
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9102'))
+METRICS_BIND_ADDRESS = os.environ.get('METRICS_BIND_ADDRESS', '0.0.0.0')
+
+
+def when_ready(server):
+    """Serve the multiprocess metrics from the master on METRICS_PORT"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR') or METRICS_PORT <= 0:
+        return
+    try:
+        from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+    except ImportError:
+        return
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(METRICS_PORT, addr=METRICS_BIND_ADDRESS, registry=registry)
+    server.log.info("📈 Prometheus metrics on %s:%s", METRICS_BIND_ADDRESS, METRICS_PORT)
+
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges (in-flight requests, pool usage) from the metrics"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
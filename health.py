@@ -0,0 +1,194 @@
+"""
+Probe endpoints and request metrics in front of the Flask app
+/healthz (liveness) and /readyz (metadata DB reachable) are served by a WSGI
+middleware, so probes never touch sessions, auth or the UI stack. Readiness
+caches its MySQL check for a few seconds so frequent probes from many
+replicas cost at most one SELECT 1 per interval
+
+Every other request is counted as in flight and timed into a latency
+histogram labelled with its URL rule; the metadata DB pool usage is
+recorded next to it so the HPA can scale on request pressure. The gunicorn
+master serves these metrics on METRICS_PORT (gunicorn_hooks.py), never on
+the public port
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = os.environ.get('HEALTH_PATH', '/healthz')
+READY_PATH = os.environ.get('READY_PATH', '/readyz')
+# Set from the request context by _record_route, read back when the request finishes
+ROUTE_ENVIRON_KEY = 'superset.metrics.route'
+READY_CACHE_SECONDS = float(os.environ.get('READY_CACHE_SECONDS', '5'))
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() == 'true'
+
+_metrics = None
+if REQUEST_METRICS_ENABLED:
+    try:
+        from prometheus_client import Counter, Gauge, Histogram
+        # PROMETHEUS_MULTIPROC_DIR makes these aggregate across gunicorn workers
+        _metrics = {
+            'in_flight': Gauge(
+                'superset_http_requests_in_flight', 'Requests currently being handled',
+                multiprocess_mode='livesum',
+            ),
+            'threads': Gauge(
+                'superset_http_worker_threads', 'Request threads available',
+                multiprocess_mode='livesum',
+            ),
+            'latency': Histogram(
+                'superset_http_request_duration_seconds', 'Request latency by URL rule', ['method', 'route'],
+                buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+            ),
+            'requests': Counter(
+                'superset_http_requests_total', 'Requests by URL rule and status class',
+                ['method', 'route', 'status'],
+            ),
+            'pool_checked_out': Gauge(
+                'superset_db_pool_checked_out', 'Metadata DB connections in use',
+                multiprocess_mode='livesum',
+            ),
+            'pool_capacity': Gauge(
+                'superset_db_pool_capacity', 'Metadata DB pool size plus max overflow',
+                multiprocess_mode='livesum',
+            ),
+        }
+    except ImportError:
+        _metrics = None
+
+
+class ReadinessCheck:
+    """SELECT 1 against the metadata DB, result reused for READY_CACHE_SECONDS"""
+
+    def __init__(self, app, ttl=READY_CACHE_SECONDS):
+        self.app = app
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.checked_at = 0.0
+        self.result = (False, 'not checked')
+
+    def _check(self):
+        from sqlalchemy import text
+        from superset.extensions import db
+
+        try:
+            with self.app.app_context():
+                with db.engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+            return True, 'ok'
+        except Exception as e:
+            logger.warning("⚠️ Readiness check failed: %s", e)
+            return False, type(e).__name__
+
+    def __call__(self):
+        if time.monotonic() - self.checked_at < self.ttl:
+            return self.result
+        # One thread refreshes, concurrent probes get the previous result
+        if not self.lock.acquire(blocking=False):
+            return self.result
+        try:
+            self.result = self._check()
+            self.checked_at = time.monotonic()
+        finally:
+            self.lock.release()
+        return self.result
+
+
+def _update_pool_gauges():
+    try:
+        from db_pool import pool_stats
+    except ImportError:
+        return
+    pools = pool_stats()
+    _metrics['pool_checked_out'].set(sum(p['checked_out'] for p in pools))
+    _metrics['pool_capacity'].set(sum(p['pool_size'] + max(0, p['max_overflow']) for p in pools))
+
+
+def _record_route(sender, **extra):
+    """request_started handler: URL rule Flask already matched, bounded label cardinality"""
+    from flask import request
+    rule = request.url_rule
+    request.environ[ROUTE_ENVIRON_KEY] = rule.rule if rule is not None else 'unmatched'
+
+
+class HealthMiddleware:
+    """WSGI middleware answering probes/metrics and recording request metrics"""
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.ready = ReadinessCheck(app)
+        self.pid = None
+
+    def _respond(self, start_response, status, body, content_type='application/json'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        start_response(status, [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(body))),
+            ('Cache-Control', 'no-store'),
+        ])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == HEALTH_PATH:
+            return self._respond(start_response, '200 OK', '{"status": "ok"}')
+        if path == READY_PATH:
+            ok, detail = self.ready()
+            return self._respond(
+                start_response, '200 OK' if ok else '503 Service Unavailable',
+                json.dumps({'status': 'ok' if ok else 'unavailable', 'database': detail}),
+            )
+        if not _metrics:
+            return self.wsgi_app(environ, start_response)
+
+        if self.pid != os.getpid():
+            # Per worker, after the fork (gunicorn preload_app)
+            self.pid = os.getpid()
+            _metrics['threads'].set(int(os.environ.get('SERVER_THREADS_AMOUNT', '1')))
+
+        status_holder = []
+
+        def recording_start_response(status, headers, exc_info=None):
+            status_holder.append(status)
+            return start_response(status, headers, exc_info)
+
+        _metrics['in_flight'].inc()
+        started = time.perf_counter()
+        finished = []
+
+        def finish():
+            if finished:
+                return
+            finished.append(True)
+            _metrics['in_flight'].dec()
+            method = environ.get('REQUEST_METHOD', 'GET')
+            route = environ.get(ROUTE_ENVIRON_KEY, 'unmatched')
+            _metrics['latency'].labels(method=method, route=route).observe(time.perf_counter() - started)
+            status = status_holder[-1][:1] + 'xx' if status_holder else '5xx'
+            _metrics['requests'].labels(method=method, route=route, status=status).inc()
+            _update_pool_gauges()
+
+        try:
+            app_iter = self.wsgi_app(environ, recording_start_response)
+        except Exception:
+            finish()
+            raise
+        # Streamed responses are in flight until the server closes the iterable
+        from werkzeug.wsgi import ClosingIterator
+        return ClosingIterator(app_iter, finish)
+
+
+def init_health(app):
+    """Install the probe/metrics middleware in front of everything else"""
+    app.wsgi_app = HealthMiddleware(app.wsgi_app, app)
+    if _metrics:
+        from flask import request_started
+        request_started.connect(_record_route, app)
+    else:
+        logger.info("ℹ️ prometheus_client not installed or REQUEST_METRICS_ENABLED=false, request metrics disabled")
@@ -0,0 +1,74 @@
+"""
+Path-classified HTTP caching policy for Superset responses
+Fingerprinted static bundles are cached for a year as immutable, login /
+logout / ACS responses are never stored, and everything else (API, chart
+data, regular pages) keeps the headers Superset already sets. Only caching
+headers are touched, framing and other security headers stay with
+HTTP_HEADERS / Talisman
+"""
+import os
+import re
+
+from flask import request
+
+# Webpack output carries a content hash in the file name, e.g.
+# spa.5f1c0a9e3b7d2c4a6e8f.entry.js or 1234.0a1b2c3d.chunk.js
+FINGERPRINTED_ASSET = re.compile(
+    r'[.\-_][0-9a-f]{8,}(?:\.(?:entry|chunk))?\.'
+    r'(?:js|mjs|css|map|woff2?|ttf|eot|otf|svg|png|jpe?g|gif|webp|ico)$',
+    re.IGNORECASE
+)
+STATIC_PREFIX = '/static/'
+IMMUTABLE_MAX_AGE = int(os.environ.get('HTTP_CACHE_IMMUTABLE_MAX_AGE', str(365 * 24 * 3600)))
+NO_STORE_PATHS = tuple(
+    path.strip() for path in
+    os.environ.get('HTTP_CACHE_NO_STORE_PATHS', '/login,/logout,/acs').split(',')
+    if path.strip()
+)
+
+IMMUTABLE = 'immutable'
+NO_STORE = 'no-store'
+DEFAULT = 'default'
+
+
+def classify(path):
+    """Caching class of a request path"""
+    if path.startswith(STATIC_PREFIX) and FINGERPRINTED_ASSET.search(path):
+        return IMMUTABLE
+    # /login and /login/..., but not /loginfoo
+    if any(path == prefix or path.startswith(prefix.rstrip('/') + '/') for prefix in NO_STORE_PATHS):
+        return NO_STORE
+    return DEFAULT
+
+
+def no_store(response):
+    """Never cache this response (authentication state, logout, ACS)"""
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
+
+def immutable(response):
+    """Cache a content-hashed asset for good, with an ETag for forced reloads"""
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response.headers.pop('Expires', None)
+    response.headers.pop('Pragma', None)
+    if not response.get_etag()[0] and not response.direct_passthrough:
+        response.add_etag()
+    return response
+
+
+def apply_cache_policy(response):
+    """after_request hook applying the policy of the request's path class"""
+    policy = classify(request.path)
+    if policy == NO_STORE:
+        return no_store(response)
+    if policy == IMMUTABLE and response.status_code in (200, 304):
+        return immutable(response)
+    return response
+
+
+def init_http_cache(app):
+    """Register the response-header policy on the Superset app"""
+    app.after_request(apply_cache_policy)
@@ -0,0 +1,232 @@
+"""
+Bulk SAML user pre-provisioning for Superset
+Reads a CSV or SCIM JSON export from the IdP and upserts users and role
+memberships in batched transactions, using the same attribute and role
+mapping as the SAML login path
+
+New users get the email local part as username, like at SAML login. When
+that username is already taken (in the database or earlier in the export)
+the user gets a numbered username, or is skipped with --username-conflict skip
+
+Usage:
+    superset saml-provision-users --file users.csv              # dry run
+    superset saml-provision-users --file users.json --apply     # write
+"""
+import csv
+import json
+import secrets
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from saml_provisioning import (
+    CLAIM_GIVEN_NAME,
+    CLAIM_GROUPS,
+    CLAIM_ROLES,
+    CLAIM_SURNAME,
+    SamlUserProvisioner,
+    userinfo_from_saml,
+)
+
+# Friendly CSV headers accepted next to full claim URIs
+CSV_COLUMNS = {
+    'givenname': CLAIM_GIVEN_NAME,
+    'given_name': CLAIM_GIVEN_NAME,
+    'first_name': CLAIM_GIVEN_NAME,
+    'surname': CLAIM_SURNAME,
+    'last_name': CLAIM_SURNAME,
+    'groups': CLAIM_GROUPS,
+    'roles': CLAIM_ROLES,
+}
+CSV_EMAIL_COLUMNS = ('email', 'nameid', 'mail', 'userprincipalname')
+MULTI_VALUE_SEPARATOR = ';'
+
+
+def read_csv(path):
+    """Yield (nameid, attributes) pairs from a CSV export"""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        for row in csv.DictReader(fh):
+            row = {(k or '').strip(): (v or '').strip() for k, v in row.items()}
+            lowered = {k.lower(): v for k, v in row.items()}
+            nameid = next((lowered[c] for c in CSV_EMAIL_COLUMNS if lowered.get(c)), None)
+            if not nameid:
+                continue
+            attributes = {}
+            for column, value in row.items():
+                claim = CSV_COLUMNS.get(column.lower(), column if '://' in column else None)
+                if claim and value:
+                    attributes[claim] = [v.strip() for v in value.split(MULTI_VALUE_SEPARATOR) if v.strip()]
+            yield nameid, attributes
+
+
+def read_scim(path):
+    """Yield (nameid, attributes) pairs from a SCIM 2.0 ListResponse or user list"""
+    with open(path, encoding='utf-8') as fh:
+        data = json.load(fh)
+    resources = data.get('Resources', []) if isinstance(data, dict) else data
+    for resource in resources:
+        if resource.get('active') is False:
+            continue
+        emails = resource.get('emails') or []
+        primary = next((e.get('value') for e in emails if e.get('primary')), None)
+        nameid = primary or (emails[0].get('value') if emails else None) or resource.get('userName')
+        if not nameid:
+            continue
+        name = resource.get('name') or {}
+        attributes = {}
+        if name.get('givenName'):
+            attributes[CLAIM_GIVEN_NAME] = [name['givenName']]
+        if name.get('familyName'):
+            attributes[CLAIM_SURNAME] = [name['familyName']]
+        # Group claims may carry either object IDs or display names, offer both
+        groups = []
+        for group in resource.get('groups') or []:
+            groups.extend(v for v in (group.get('value'), group.get('display')) if v)
+        if groups:
+            attributes[CLAIM_GROUPS] = groups
+        roles = [r.get('value') for r in resource.get('roles') or [] if r.get('value')]
+        if roles:
+            attributes[CLAIM_ROLES] = roles
+        yield nameid, attributes
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _free_username(session, user_model, base, taken):
+    """First of base2, base3, ... not in the database and not planned in this run"""
+    suffix = 2
+    while True:
+        candidate = f"{base}{suffix}"
+        if candidate.lower() not in taken and not session.query(user_model.id).filter(
+            user_model.username == candidate
+        ).first():
+            return candidate
+        suffix += 1
+
+
+@click.command('saml-provision-users')
+@click.option('--file', 'path', required=True, type=click.Path(exists=True, dir_okay=False), help='CSV or SCIM JSON export')
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'csv', 'scim']), default='auto', show_default=True)
+@click.option('--apply', is_flag=True, help='Write changes (default is a dry-run diff)')
+@click.option('--batch-size', default=500, show_default=True, help='Users per transaction')
+@click.option(
+    '--username-conflict', type=click.Choice(['suffix', 'skip']), default='suffix', show_default=True,
+    help='New users whose username is taken: number the username or skip the user'
+)
+@click.option('--verbose', '-v', is_flag=True, help='Print every created/updated user')
+@with_appcontext
+def provision_users_command(path, fmt, apply, batch_size, username_conflict, verbose):
+    """Upsert SAML users and role memberships from an IdP export"""
+    if fmt == 'auto':
+        fmt = 'scim' if path.lower().endswith('.json') else 'csv'
+    reader = read_scim if fmt == 'scim' else read_csv
+
+    records = {}
+    for nameid, attributes in reader(path):
+        userinfo = userinfo_from_saml(attributes, nameid)
+        records[userinfo['email'].lower()] = userinfo
+    click.echo(f"📄 Read {len(records)} users from {path} ({fmt})")
+
+    sm = current_app.appbuilder.sm
+    provisioner = getattr(sm, 'saml_provisioner', None) or SamlUserProvisioner(sm)
+    session = sm.get_session
+    user_model = sm.user_model
+    # One unusable password hash for all new rows instead of hashing per user
+    unusable_password = None
+
+    totals = {'create': 0, 'update': 0, 'unchanged': 0, 'conflict': 0}
+    # Lowercased usernames of users created by this run (MySQL compares them case-insensitively)
+    planned_usernames = set()
+    for batch in _batches(list(records.values()), batch_size):
+        emails = [u['email'] for u in batch]
+        existing = {
+            (user.email or '').lower(): user
+            for user in session.query(user_model).filter(user_model.email.in_(emails))
+        }
+        candidates = [u['username'] for u in batch if u['email'].lower() not in existing]
+        taken_usernames = {
+            (username or '').lower()
+            for (username,) in session.query(user_model.username).filter(user_model.username.in_(candidates))
+        } if candidates else set()
+        for userinfo in batch:
+            user = existing.get(userinfo['email'].lower())
+            if user is None:
+                username = userinfo['username']
+                if username.lower() in taken_usernames or username.lower() in planned_usernames:
+                    totals['conflict'] += 1
+                    if username_conflict == 'skip':
+                        click.echo(f"  ! {userinfo['email']} username {username!r} is taken, skipped")
+                        continue
+                    username = _free_username(session, user_model, username, planned_usernames)
+                    click.echo(f"  ! {userinfo['email']} username {userinfo['username']!r} is taken, using {username!r}")
+                planned_usernames.add(username.lower())
+                totals['create'] += 1
+                roles = provisioner.desired_roles(userinfo)
+                if verbose or not apply:
+                    click.echo(f"  + {userinfo['email']} username={username!r} roles={sorted(roles)}")
+                if apply:
+                    if unusable_password is None:
+                        from werkzeug.security import generate_password_hash
+                        unusable_password = generate_password_hash(secrets.token_urlsafe(32))
+                    session.add(user_model(
+                        username=username,
+                        first_name=userinfo['first_name'],
+                        last_name=userinfo['last_name'],
+                        email=userinfo['email'],
+                        active=True,
+                        password=unusable_password,
+                        roles=provisioner.find_roles(roles),
+                    ))
+                continue
+
+            changes = {}
+            if user.first_name != userinfo['first_name']:
+                changes['first_name'] = (user.first_name, userinfo['first_name'])
+            if user.last_name != userinfo['last_name']:
+                changes['last_name'] = (user.last_name, userinfo['last_name'])
+            current_roles = frozenset(role.name for role in user.roles)
+            wanted = provisioner.desired_roles(userinfo, existing=current_roles)
+            if wanted is not None and wanted != current_roles:
+                changes['roles'] = (sorted(current_roles), sorted(wanted))
+            if not changes:
+                totals['unchanged'] += 1
+                continue
+
+            totals['update'] += 1
+            if verbose or not apply:
+                diff = ', '.join(f"{field}: {old!r} -> {new!r}" for field, (old, new) in changes.items())
+                click.echo(f"  ~ {userinfo['email']} {diff}")
+            if apply:
+                if 'first_name' in changes:
+                    user.first_name = userinfo['first_name']
+                if 'last_name' in changes:
+                    user.last_name = userinfo['last_name']
+                if 'roles' in changes:
+                    user.roles = provisioner.find_roles(wanted)
+
+        if apply:
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        else:
+            session.rollback()
+
+    conflicts = f", {totals['conflict']} username conflicts ({username_conflict})" if totals['conflict'] else ''
+    if apply:
+        click.echo(
+            f"✅ Created {totals['create']}, updated {totals['update']}, "
+            f"{totals['unchanged']} unchanged{conflicts}"
+        )
+    else:
+        click.echo(
+            f"✅ Dry run: {totals['create']} to create, {totals['update']} to update, "
+            f"{totals['unchanged']} unchanged{conflicts}"
+        )
+        if totals['create'] or totals['update']:
+            click.echo("ℹ️  Re-run with --apply to write these changes")
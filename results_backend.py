@@ -0,0 +1,209 @@
+"""
+SQL Lab results backend on a shared volume
+Stores the compressed result payloads Superset produces (msgpack + Arrow
+columnar when RESULTS_BACKEND_USE_MSGPACK is on, then zlib) as files with a
+size-bounded eviction policy, so large results survive worker restarts and
+do not live in Redis or web worker memory between requests
+"""
+import os
+import time
+import errno
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+
+from cachelib.base import BaseCache
+
+logger = logging.getLogger(__name__)
+
+# 8-byte big-endian expiry timestamp (0 = never) in front of every payload
+_HEADER = struct.Struct('>d')
+
+
+class FileSystemResultsBackend(BaseCache):
+    """
+    cachelib backend writing one file per result key.
+
+    Writes go to a temp file in the same directory and are renamed into
+    place, so readers on other pods never see partial payloads. Reads map
+    the file and copy the payload out once. When the directory grows past
+    ``max_bytes`` the least recently read files are evicted; the scan runs at
+    most every ``evict_interval`` seconds per process.
+    """
+
+    def __init__(self, directory, max_bytes=10 * 1024 ** 3, default_timeout=86400, evict_interval=30):
+        super().__init__(default_timeout=default_timeout)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return 0.0 if timeout == 0 else time.time() + timeout
+
+    def _read(self, path):
+        """Return the payload at ``path`` or None when missing or expired"""
+        try:
+            with open(path, 'rb') as fh:
+                header = fh.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+                expires_at = _HEADER.unpack(header)[0]
+                # Expired payloads are never read, the rest is read once straight into bytes
+                payload = None if expires_at and expires_at < time.time() else fh.read()
+        except FileNotFoundError:
+            return None
+        if payload is None:
+            self._remove(path)
+            return None
+        # Reads mark the file as recently used for eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return payload
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get(self, key):
+        return self._read(self._path(key))
+
+    def set(self, key, value, timeout=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(_HEADER.pack(self._expires_at(timeout)))
+                fh.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("❌ Could not store result %s: %s", key, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        self._maybe_evict()
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        return self._remove(self._path(key))
+
+    def has(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                header = fh.read(_HEADER.size)
+        except FileNotFoundError:
+            return False
+        if len(header) < _HEADER.size:
+            return False
+        expires_at = _HEADER.unpack(header)[0]
+        return not expires_at or expires_at >= time.time()
+
+    def clear(self):
+        for path, _, _ in self._scan():
+            self._remove(path)
+        return True
+
+    def _scan(self):
+        """Yield (path, size, mtime) for every stored result"""
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.tmp-'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict < self.evict_interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_evict = now
+            files = sorted(self._scan(), key=lambda item: item[2])
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            for path, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    evicted += 1
+                total -= size
+            if evicted:
+                logger.info("🧹 Evicted %s SQL Lab results to stay under %s bytes", evicted, self.max_bytes)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                logger.warning("⚠️ Results eviction failed: %s", e)
+        finally:
+            self._lock.release()
+
+
+def on_mounted_volume(directory):
+    """Whether ``directory`` or one of its parents (other than /) is a mount point"""
+    path = os.path.realpath(directory)
+    while path != os.path.dirname(path):
+        if os.path.ismount(path):
+            return True
+        path = os.path.dirname(path)
+    return False
+
+
+def build_results_backend(redis_url=None):
+    """
+    RESULTS_BACKEND from RESULTS_BACKEND_TYPE: redis (default when a Redis URL
+    is available) or filesystem, which must be a volume shared by web and worker pods
+    """
+    default_timeout = int(os.environ.get('RESULTS_BACKEND_TIMEOUT', '86400'))
+    backend_type = os.environ.get('RESULTS_BACKEND_TYPE', 'redis' if redis_url else 'filesystem').lower()
+    if backend_type == 'redis':
+        import redis
+        from cachelib.redis import RedisCache
+        return RedisCache(
+            host=redis.Redis.from_url(os.environ.get('RESULTS_BACKEND_REDIS_URL', redis_url)),
+            key_prefix='superset_results_',
+            default_timeout=default_timeout
+        )
+    directory = os.environ.get('RESULTS_BACKEND_DIR', '/app/superset_home/sqllab_results')
+    if not on_mounted_volume(directory):
+        # Results written by a worker container would be invisible to the web containers
+        logger.error(
+            "❌ RESULTS_BACKEND_DIR %s is not on a mounted volume: async SQL Lab results are only "
+            "readable inside this container. Mount a volume shared with the workers or use "
+            "RESULTS_BACKEND_TYPE=redis", directory
+        )
+    return FileSystemResultsBackend(
+        directory,
+        max_bytes=int(os.environ.get('RESULTS_BACKEND_MAX_BYTES', str(10 * 1024 ** 3))),
+        default_timeout=default_timeout,
+    )
@@ -0,0 +1,104 @@
+"""
+Timing and outcome metrics for the SAML login flow
+Each phase of an ACS request is timed and sent to Superset's STATS_LOGGER
+(statsd when configured) and, when prometheus_client is installed, to
+Prometheus histograms/counters. The whole login is also logged once as a
+structured record with the per-phase durations
+"""
+import os
+import re
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = 'saml'
+SAML_PROMETHEUS_ENABLED = os.environ.get('SAML_PROMETHEUS_ENABLED', 'true').lower() == 'true'
+
+_prometheus = None
+if SAML_PROMETHEUS_ENABLED:
+    try:
+        from prometheus_client import Counter, Histogram
+        # PROMETHEUS_MULTIPROC_DIR makes these aggregate across gunicorn workers
+        _prometheus = {
+            'phase': Histogram(
+                'superset_saml_phase_seconds', 'Time spent in each SAML login phase', ['phase'],
+                buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+            ),
+            'logins': Counter(
+                'superset_saml_logins_total', 'SAML login attempts by outcome', ['outcome', 'reason'],
+            ),
+        }
+    except ImportError:
+        _prometheus = None
+
+
+def _stats_logger():
+    """Superset's configured STATS_LOGGER, or None outside an app context"""
+    try:
+        from flask import current_app
+        return current_app.config.get('STATS_LOGGER')
+    except RuntimeError:
+        return None
+
+
+def _key(value):
+    return re.sub(r'[^a-z0-9_]+', '_', str(value).lower()).strip('_') or 'unknown'
+
+
+class SamlLoginTrace:
+    """Per-request collection of phase timings and the final outcome"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.outcome = None
+        self.reason = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        stats = _stats_logger()
+        if stats is not None:
+            # Superset's own timings are reported in milliseconds
+            stats.timing(f'{STATS_PREFIX}.phase.{name}', seconds * 1000)
+        if _prometheus:
+            _prometheus['phase'].labels(phase=name).observe(seconds)
+
+    def finish(self, outcome, reason=None, **fields):
+        """Count the outcome and log the login as one structured record"""
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        self.reason = _key(reason) if reason else None
+        total = time.perf_counter() - self.started
+        self.record('total', total)
+
+        stats = _stats_logger()
+        if stats is not None:
+            stats.incr(f'{STATS_PREFIX}.login.{outcome}')
+            if self.reason:
+                stats.incr(f'{STATS_PREFIX}.login.{outcome}.{self.reason}')
+        if _prometheus:
+            _prometheus['logins'].labels(outcome=outcome, reason=self.reason or '').inc()
+
+        level = logging.INFO if outcome == 'success' else logging.WARNING
+        if logger.isEnabledFor(level):
+            phases_ms = {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+            logger.log(
+                level, "SAML login %s%s in %.1fms %s",
+                outcome, f" ({self.reason})" if self.reason else '', total * 1000, phases_ms,
+                extra={'saml': dict(fields, outcome=outcome, reason=self.reason, phases_ms=phases_ms)},
+            )
+
+
+def trace():
+    return SamlLoginTrace()
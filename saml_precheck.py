@@ -0,0 +1,145 @@
+"""
+Cheap pre-parse checks and admission control for incoming SAML responses
+Rejects oversized or malformed SAMLResponse payloads before any XML work and
+bounds concurrent signature verification per worker
+"""
+import os
+import re
+import time
+import base64
+import binascii
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Azure AD responses with group claims are typically 10-30KB base64 encoded
+SAML_MAX_RESPONSE_BYTES = int(os.environ.get('SAML_MAX_RESPONSE_BYTES', str(256 * 1024)))
+# Issuer, Destination and InResponseTo all live in the first few KB of a Response
+SAML_SNIFF_BYTES = 8192
+
+_BASE64_RE = re.compile(rb'^[A-Za-z0-9+/]+={0,2}$')
+_RESPONSE_RE = re.compile(rb'<(?:[\w-]+:)?Response\b([^>]*)>')
+_ISSUER_RE = re.compile(rb'<(?:[\w-]+:)?Issuer\b[^>]*>\s*([^<\s]+)\s*</(?:[\w-]+:)?Issuer>')
+_DESTINATION_RE = re.compile(rb'\bDestination=(?:"([^"]*)"|\'([^\']*)\')')
+_IN_RESPONSE_TO_RE = re.compile(rb'\bInResponseTo=(?:"([^"]*)"|\'([^\']*)\')')
+
+
+class SamlPrecheckError(Exception):
+    """Raised when a SAMLResponse is rejected before XML parsing"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class SamlBusyError(Exception):
+    """Raised when no signature verification slot frees up in time"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'SAML verification saturated, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _decode(value):
+    return value.decode('utf-8', 'replace')
+
+
+def _attribute(pattern, tag):
+    """Value of a single- or double-quoted attribute, None if absent"""
+    match = pattern.search(tag)
+    if not match:
+        return None
+    return _decode(match.group(1) if match.group(1) is not None else match.group(2))
+
+
+def precheck_saml_response(encoded, expected_issuer=None, current_url=None, strict=True):
+    """
+    Validate a raw SAMLResponse form value without parsing XML.
+
+    Checks the encoded size, base64 alphabet, that the payload looks like a
+    samlp:Response without a DOCTYPE, and sniffs Issuer and Destination. Like
+    python3-saml, Issuer and Destination are only compared with the configured
+    IdP entity ID and the posted-to URL in strict mode.
+    Returns the sniffed values so callers can reuse them.
+    """
+    if not encoded:
+        raise SamlPrecheckError('empty', 'Empty SAMLResponse')
+    if len(encoded) > SAML_MAX_RESPONSE_BYTES:
+        raise SamlPrecheckError('too_large', f'SAMLResponse is {len(encoded)} bytes, limit is {SAML_MAX_RESPONSE_BYTES}')
+
+    try:
+        data = b''.join(encoded.encode('ascii').split())
+    except UnicodeEncodeError:
+        raise SamlPrecheckError('bad_base64', 'SAMLResponse contains non-ASCII characters')
+    if len(data) % 4 or not _BASE64_RE.match(data):
+        raise SamlPrecheckError('bad_base64', 'SAMLResponse is not valid base64')
+    try:
+        xml = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise SamlPrecheckError('bad_base64', 'SAMLResponse is not valid base64')
+
+    head = xml[:SAML_SNIFF_BYTES]
+    if b'<!DOCTYPE' in head or b'<!ENTITY' in head:
+        raise SamlPrecheckError('doctype', 'SAMLResponse contains a DOCTYPE declaration')
+    response = _RESPONSE_RE.search(head)
+    if not response:
+        raise SamlPrecheckError('not_a_response', 'SAMLResponse does not contain a Response element')
+
+    issuer_match = _ISSUER_RE.search(head)
+    issuer = _decode(issuer_match.group(1)) if issuer_match else None
+    destination = _attribute(_DESTINATION_RE, response.group(1))
+    if strict:
+        if expected_issuer and issuer is not None and issuer != expected_issuer:
+            raise SamlPrecheckError('issuer_mismatch', f'Unexpected issuer: {issuer}')
+        # Same prefix rule python3-saml applies after parsing
+        if current_url and destination and not destination.lower().startswith(current_url.lower()):
+            raise SamlPrecheckError('destination_mismatch', f'Unexpected destination: {destination}')
+
+    return {
+        'issuer': issuer,
+        'destination': destination,
+        'in_response_to': _attribute(_IN_RESPONSE_TO_RE, response.group(1)),
+    }
+
+
+class VerificationLimiter:
+    """
+    Per-worker cap on concurrent SAML signature verification.
+
+    Callers wait at most ``wait_timeout`` seconds for a slot, after which
+    SamlBusyError is raised so the view can answer 503 with Retry-After and
+    keep the remaining gunicorn threads free for dashboard traffic.
+    """
+
+    def __init__(self, max_concurrent, wait_timeout, retry_after):
+        self.max_concurrent = max(1, max_concurrent)
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+
+    @contextmanager
+    def slot(self):
+        """Hold a verification slot, yielding the seconds spent waiting for it"""
+        start = time.perf_counter()
+        if not self._semaphore.acquire(timeout=self.wait_timeout):
+            logger.warning("⏳ SAML verification saturated (%s in flight)", self.max_concurrent)
+            raise SamlBusyError(self.retry_after)
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self._semaphore.release()
+
+
+def _default_max_concurrent():
+    # A quarter of the gthread pool by default, see run-server.sh SERVER_THREADS_AMOUNT
+    threads = int(os.environ.get('SERVER_THREADS_AMOUNT', '20'))
+    return max(2, threads // 4)
+
+
+verification_limiter = VerificationLimiter(
+    max_concurrent=int(os.environ.get('SAML_MAX_CONCURRENT_VERIFICATIONS', str(_default_max_concurrent()))),
+    wait_timeout=float(os.environ.get('SAML_VERIFICATION_WAIT_TIMEOUT', '2')),
+    retry_after=int(os.environ.get('SAML_BUSY_RETRY_AFTER', '5')),
+)
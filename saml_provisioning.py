@@ -0,0 +1,187 @@
+"""
+SAML user provisioning and role sync for Superset
+Maps IdP claims to Superset users and roles, caches lookups per worker and
+only writes to ab_user/ab_user_role when something actually changed
+"""
+import os
+import logging
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CLAIM_GIVEN_NAME = 'http://schemas.xmlsoap.org/ws/2005/05/identity/claims/givenname'
+CLAIM_SURNAME = 'http://schemas.xmlsoap.org/ws/2005/05/identity/claims/surname'
+CLAIM_GROUPS = 'http://schemas.microsoft.com/ws/2008/06/identity/claims/groups'
+CLAIM_ROLES = 'http://schemas.microsoft.com/ws/2008/06/identity/claims/role'
+
+# Claims whose values are matched against AUTH_ROLES_MAPPING keys
+SAML_GROUP_ATTRIBUTES = [
+    attr.strip() for attr in os.environ.get(
+        'SAML_GROUP_ATTRIBUTES', f'{CLAIM_GROUPS},{CLAIM_ROLES}'
+    ).split(',') if attr.strip()
+]
+
+
+def userinfo_from_saml(attributes, nameid):
+    """Extract email, username, names and group keys from SAML attributes"""
+    email = nameid  # Usually email from Azure AD
+    local_part = email.split('@')[0]
+    groups = None
+    for attr in SAML_GROUP_ATTRIBUTES:
+        if attr in attributes:
+            groups = (groups or []) + list(attributes[attr])
+    return {
+        'email': email,
+        'username': local_part,  # Use email prefix as username
+        'first_name': attributes.get(CLAIM_GIVEN_NAME, [local_part])[0],
+        'last_name': attributes.get(CLAIM_SURNAME, ['User'])[0],
+        # None means the assertion carried no group claims at all
+        'groups': groups,
+    }
+
+
+class RoleMapper:
+    """Precompiled AUTH_ROLES_MAPPING index: group key -> Superset role names"""
+
+    def __init__(self, roles_mapping, default_role=None):
+        self.index = {
+            key: tuple(roles) for key, roles in (roles_mapping or {}).items()
+        }
+        self.default_role = default_role
+
+    def maps_any(self, groups):
+        """True when at least one group key has an AUTH_ROLES_MAPPING entry"""
+        return any(group in self.index for group in groups or ())
+
+    def roles_for(self, groups):
+        names = set()
+        for group in groups or ():
+            names.update(self.index.get(group, ()))
+        # Same as Flask-AppBuilder: the registration role is always granted
+        if self.default_role:
+            names.add(self.default_role)
+        return frozenset(names)
+
+
+class SamlUserProvisioner:
+    """
+    Find, create or update the Superset user behind a SAML assertion.
+
+    A per-worker snapshot of each user (id, names, role names) lets repeat
+    logins skip the email lookup and the diff entirely: when the assertion
+    matches the snapshot the user is loaded by primary key and nothing is
+    written. Role rows are resolved once and cached by name.
+    """
+
+    def __init__(self, security_manager, user_ttl=None, role_ttl=None):
+        self.sm = security_manager
+        if user_ttl is None:
+            user_ttl = float(os.environ.get('SAML_USER_CACHE_TTL', '300'))
+        if role_ttl is None:
+            role_ttl = float(os.environ.get('SAML_ROLE_CACHE_TTL', '600'))
+        self.users = TTLCache(user_ttl)
+        self.role_ids = TTLCache(role_ttl, maxsize=1000)
+        self._mapper = None
+
+    @property
+    def mapper(self):
+        if self._mapper is None:
+            config = self.sm.appbuilder.get_app.config
+            self._mapper = RoleMapper(
+                config.get('AUTH_ROLES_MAPPING', {}),
+                default_role=os.environ.get('SAML_DEFAULT_ROLE', config.get('AUTH_USER_REGISTRATION_ROLE', 'Gamma')),
+            )
+        return self._mapper
+
+    @property
+    def sync_roles(self):
+        return bool(self.sm.appbuilder.get_app.config.get('AUTH_ROLES_SYNC_AT_LOGIN', False))
+
+    def _role_id(self, name):
+        """Cached role id for ``name``, 0 when the role does not exist"""
+        role_id = self.role_ids.get(name)
+        if role_id is None:
+            role = self.sm.find_role(name)
+            role_id = role.id if role else 0
+            if not role:
+                logger.warning("⚠️ Role %s from AUTH_ROLES_MAPPING does not exist", name)
+            self.role_ids.set(name, role_id)
+        return role_id
+
+    def find_roles(self, names):
+        """Resolve role names to Role objects by cached primary key"""
+        query = self.sm.get_session.query(self.sm.role_model)
+        roles = [query.get(role_id) for role_id in map(self._role_id, sorted(names)) if role_id]
+        return [role for role in roles if role is not None]
+
+    @staticmethod
+    def _snapshot(user):
+        return {
+            'id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'roles': frozenset(role.name for role in user.roles),
+        }
+
+    def desired_roles(self, userinfo, existing=None):
+        """Role names the user should end up with, or None to leave roles untouched"""
+        if existing is not None and not (self.sync_roles and userinfo['groups'] is not None):
+            # No sync configured, or the IdP sent no group claims: keep roles as they are
+            return None
+        if existing is not None and not self.mapper.maps_any(userinfo['groups']):
+            # Claims that map to nothing usually mean AUTH_ROLES_MAPPING is keyed by something
+            # else than the IdP sends; never strip manually granted roles down to the default
+            logger.warning(
+                "⚠️ None of the %s group claims of %s match AUTH_ROLES_MAPPING, keeping their roles",
+                len(userinfo['groups']), userinfo['email']
+            )
+            return None
+        return frozenset(name for name in self.mapper.roles_for(userinfo['groups']) if self._role_id(name))
+
+    def provision(self, userinfo):
+        """Return the user for ``userinfo``, creating or updating it only if needed"""
+        key = userinfo['email'].lower()
+        snapshot = self.users.get(key)
+        if snapshot is not None:
+            wanted = self.desired_roles(userinfo, existing=snapshot['roles'])
+            if (snapshot['first_name'] == userinfo['first_name']
+                    and snapshot['last_name'] == userinfo['last_name']
+                    and (wanted is None or wanted == snapshot['roles'])):
+                user = self.sm.get_user_by_id(snapshot['id'])
+                if user is not None:
+                    return user
+            self.users.pop(key)
+
+        user = self.sm.find_user(email=userinfo['email'])
+        if user is None:
+            roles = self.find_roles(self.desired_roles(userinfo))
+            user = self.sm.add_user(
+                username=userinfo['username'],
+                first_name=userinfo['first_name'],
+                last_name=userinfo['last_name'],
+                email=userinfo['email'],
+                role=roles
+            )
+            if not user:
+                return None
+            logger.info("✅ Created new SAML user: %s", userinfo['username'])
+        else:
+            current = self._snapshot(user)
+            changed = []
+            if current['first_name'] != userinfo['first_name']:
+                user.first_name = userinfo['first_name']
+                changed.append('first_name')
+            if current['last_name'] != userinfo['last_name']:
+                user.last_name = userinfo['last_name']
+                changed.append('last_name')
+            wanted = self.desired_roles(userinfo, existing=current['roles'])
+            if wanted is not None and wanted != current['roles']:
+                user.roles = self.find_roles(wanted)
+                changed.append('roles')
+            if changed:
+                self.sm.update_user(user)
+                logger.info("✅ Updated SAML user %s: %s", user.username, ', '.join(changed))
+
+        self.users.set(key, self._snapshot(user))
+        return user
@@ -0,0 +1,244 @@
+"""
+Shared AuthnRequest-ID and assertion-ID store for SAML logins
+AuthnRequest IDs issued by any replica are recorded so the ACS on any other
+replica can pass the matching request_id to python3-saml (required by
+rejectUnsolicitedResponsesWithInResponseTo) and consume it exactly once.
+Assertion IDs are recorded until the assertion's NotOnOrAfter plus the
+allowed clock skew, so a captured response cannot be replayed on any pod.
+
+Each worker keeps an in-memory expiring set in front of a shared store: the
+metadata database (default) or a Redis-compatible server. Every lookup is a
+primary-key operation; the MySQL table is created by bootstrap.py.
+SAML_REPLAY_BACKEND=memory keeps IDs per process and
+is only correct with a single worker
+"""
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Time a user may spend at the IdP (MFA, password reset) before the ACS post
+SAML_REQUEST_ID_TTL = int(os.environ.get('SAML_REQUEST_ID_TTL', '900'))
+# Used when an assertion carries no NotOnOrAfter
+SAML_ASSERTION_ID_TTL = int(os.environ.get('SAML_ASSERTION_ID_TTL', '3600'))
+SAML_REPLAY_LOCAL_SIZE = int(os.environ.get('SAML_REPLAY_LOCAL_SIZE', '10000'))
+# Longest ID stored verbatim, longer ones are hashed to fit the primary key
+_MAX_ID_LENGTH = 180
+
+
+class SamlReplayError(Exception):
+    """Raised when a response answers an unknown request or reuses an assertion"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ExpiringSet:
+    """Thread-safe set of keys with per-key absolute expiry and a size bound"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self._entries[key]
+                return False
+            return True
+
+    def add(self, key, expires_at):
+        now = time.time()
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                for stale in [k for k, v in self._entries.items() if v < now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.maxsize:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = expires_at
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class MySQLReplayBackend:
+    """IDs in a table of the Superset metadata database"""
+
+    def __init__(self, table='superset_saml_replay'):
+        self.table = table
+
+    @staticmethod
+    def _engine():
+        # Reuse the metadata database pool configured by SQLALCHEMY_ENGINE_OPTIONS
+        from superset.extensions import db
+        return db.engine
+
+    def add(self, key, expires_at):
+        """Insert unless a live entry exists; True if this call inserted it"""
+        from sqlalchemy import text
+        now = int(time.time())
+        with self._engine().begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {self.table} WHERE id = :key AND expires_at < :now"),
+                {'key': key, 'now': now}
+            )
+            inserted = conn.execute(
+                text(f"INSERT IGNORE INTO {self.table} (id, expires_at) VALUES (:key, :expires_at)"),
+                {'key': key, 'expires_at': int(expires_at)}
+            ).rowcount == 1
+            # Opportunistic cleanup instead of a separate cron job
+            if random.random() < 0.01:
+                conn.execute(text(f"DELETE FROM {self.table} WHERE expires_at < :now LIMIT 1000"), {'now': now})
+        return inserted
+
+    def exists(self, key):
+        from sqlalchemy import text
+        with self._engine().connect() as conn:
+            return conn.execute(
+                text(f"SELECT 1 FROM {self.table} WHERE id = :key AND expires_at >= :now"),
+                {'key': key, 'now': int(time.time())}
+            ).first() is not None
+
+    def pop(self, key):
+        """Delete a live entry; True if this call removed it"""
+        from sqlalchemy import text
+        with self._engine().begin() as conn:
+            return conn.execute(
+                text(f"DELETE FROM {self.table} WHERE id = :key AND expires_at >= :now"),
+                {'key': key, 'now': int(time.time())}
+            ).rowcount == 1
+
+
+class RedisReplayBackend:
+    """IDs in a Redis-compatible store, expired by the server"""
+
+    def __init__(self, url, prefix='superset_saml_replay:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def add(self, key, expires_at):
+        return bool(self.client.set(self.prefix + key, 1, nx=True, exat=int(expires_at)))
+
+    def exists(self, key):
+        return bool(self.client.exists(self.prefix + key))
+
+    def pop(self, key):
+        return self.client.delete(self.prefix + key) == 1
+
+
+class MemoryReplayBackend:
+    """Process-local IDs, for single-process development and the benchmarks only"""
+
+    def __init__(self, maxsize=SAML_REPLAY_LOCAL_SIZE):
+        self.entries = ExpiringSet(maxsize)
+        self._lock = threading.Lock()
+
+    def add(self, key, expires_at):
+        with self._lock:
+            if key in self.entries:
+                return False
+            self.entries.add(key, expires_at)
+            return True
+
+    def exists(self, key):
+        return key in self.entries
+
+    def pop(self, key):
+        with self._lock:
+            if key not in self.entries:
+                return False
+            self.entries.discard(key)
+            return True
+
+
+class SamlReplayStore:
+    """Per-worker expiring sets in front of the shared backend"""
+
+    def __init__(self, backend, local_maxsize=SAML_REPLAY_LOCAL_SIZE):
+        self.backend = backend
+        self.requests = ExpiringSet(local_maxsize)
+        self.assertions = ExpiringSet(local_maxsize)
+
+    @staticmethod
+    def _key(kind, value):
+        if len(value) > _MAX_ID_LENGTH:
+            value = hashlib.sha256(value.encode('utf-8')).hexdigest()
+        return f'{kind}:{value}'
+
+    def remember_request(self, request_id, skew=0):
+        """Record an AuthnRequest ID issued by this SP"""
+        if not request_id:
+            return
+        key = self._key('req', request_id)
+        expires_at = time.time() + SAML_REQUEST_ID_TTL + skew
+        self.backend.add(key, expires_at)
+        self.requests.add(key, expires_at)
+
+    def is_pending_request(self, request_id):
+        """Whether any replica issued ``request_id`` and it was not answered yet"""
+        key = self._key('req', request_id)
+        return key in self.requests or self.backend.exists(key)
+
+    def consume_request(self, request_id):
+        """Mark the request answered; False if another response already used it"""
+        key = self._key('req', request_id)
+        self.requests.discard(key)
+        return self.backend.pop(key)
+
+    def use_assertion(self, assertion_id, not_on_or_after=None, skew=0):
+        """Record an assertion ID; False if it was already used on any replica"""
+        key = self._key('asrt', assertion_id)
+        if key in self.assertions:
+            return False
+        expires_at = (not_on_or_after or time.time() + SAML_ASSERTION_ID_TTL) + skew
+        if not self.backend.add(key, expires_at):
+            return False
+        self.assertions.add(key, expires_at)
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def replay_store():
+    """Process-wide store, backend chosen like the server-side session store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend_name = os.environ.get(
+                    'SAML_REPLAY_BACKEND', os.environ.get('SESSION_STORE_BACKEND', 'mysql')
+                ).lower()
+                if backend_name == 'redis':
+                    url = (
+                        os.environ.get('SAML_REPLAY_REDIS_URL')
+                        or os.environ.get('SESSION_STORE_REDIS_URL')
+                        or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+                    )
+                    backend = RedisReplayBackend(url)
+                elif backend_name == 'memory':
+                    backend = MemoryReplayBackend()
+                else:
+                    backend = MySQLReplayBackend()
+                _store = SamlReplayStore(backend)
+                logger.info("✅ SAML request/assertion ID store: %s", backend_name)
+    return _store
+
+
+def allowed_clock_skew(settings):
+    """Largest clock drift python3-saml may accept for this SP, in seconds"""
+    from onelogin.saml2.constants import OneLogin_Saml2_Constants
+    configured = settings.get_security_data().get('clockSkew', 0) or 0
+    return max(int(configured), int(getattr(OneLogin_Saml2_Constants, 'ALLOWED_CLOCK_DRIFT', 0)))
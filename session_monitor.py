@@ -0,0 +1,53 @@
+"""
+Session expiry endpoint for Superset
+Tells the browser how long the current session has left, so the leader tab
+in logout_script() can sleep until the session expires instead of polling.
+The endpoint reads the session like any request but never saves or extends
+it: asking about the expiry must not push the expiry out
+"""
+import time
+import logging
+
+from flask import jsonify, session
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_PATH = '/session/ttl/'
+
+
+def _lifetime(app):
+    return int(app.permanent_session_lifetime.total_seconds())
+
+
+def session_ttl(now=None):
+    """Seconds left before the current session expires, 0 when not logged in, None when unknown"""
+    if '_user_id' not in session:
+        return 0
+    # Server-side sessions (session_store.py) know their record's expiry, signed
+    # cookie sessions carry theirs only in the browser's cookie
+    expires_at = getattr(session, 'expires_at', None)
+    if expires_at is None:
+        return None
+    return max(0, int(expires_at - (now or time.time())))
+
+
+def init_session_monitor(app):
+    """Register the session TTL endpoint"""
+
+    def session_ttl_view():
+        ttl = session_ttl()
+        # Honoured by session_store.ServerSideSessionInterface.save_session
+        session.modified = False
+        session.no_touch = True
+        authenticated = ttl is None or ttl > 0
+        response = jsonify({
+            'authenticated': authenticated,
+            'ttl': ttl,
+            'lifetime': _lifetime(app),
+        })
+        if not authenticated:
+            response.status_code = 401
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    app.add_url_rule(SESSION_TTL_PATH, 'session_ttl', session_ttl_view, methods=['GET'])
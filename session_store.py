@@ -0,0 +1,293 @@
+"""
+Server-side Flask session store for Superset
+Keeps session data in MySQL (default) or a Redis-compatible store so the
+browser cookie only carries a signed, opaque session ID. Each worker reuses a
+record it read for a few seconds (SESSION_STORE_LOCAL_CACHE_TTL), so a logout
+or regenerate() on another pod applies within that window; on the same worker
+it applies at once. Static assets never load the session. The MySQL table is
+created by bootstrap.py
+"""
+import os
+import time
+import random
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+
+class MySQLSessionBackend:
+    """Session records in a table of the Superset metadata database"""
+
+    def __init__(self, table='superset_server_sessions'):
+        self.table = table
+
+    @staticmethod
+    def _engine():
+        # Reuse the metadata database pool configured by SQLALCHEMY_ENGINE_OPTIONS
+        from superset.extensions import db
+        return db.engine
+
+    def get(self, key):
+        from sqlalchemy import text
+        with self._engine().connect() as conn:
+            row = conn.execute(
+                text(f"SELECT data, expires_at FROM {self.table} WHERE session_id = :key AND expires_at > :now"),
+                {'key': key, 'now': int(time.time())}
+            ).first()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, key, value, expires_at):
+        from sqlalchemy import text
+        with self._engine().begin() as conn:
+            conn.execute(
+                text(
+                    f"INSERT INTO {self.table} (session_id, data, expires_at) VALUES (:key, :data, :expires_at) "
+                    "ON DUPLICATE KEY UPDATE data = VALUES(data), expires_at = VALUES(expires_at)"
+                ),
+                {'key': key, 'data': value, 'expires_at': expires_at}
+            )
+            # Opportunistic cleanup instead of a separate cron job
+            if random.random() < 0.001:
+                conn.execute(
+                    text(f"DELETE FROM {self.table} WHERE expires_at < :now LIMIT 1000"),
+                    {'now': int(time.time())}
+                )
+
+    def delete(self, key):
+        from sqlalchemy import text
+        with self._engine().begin() as conn:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE session_id = :key"), {'key': key})
+
+
+class RedisSessionBackend:
+    """Session records in a Redis-compatible store, expired by the server"""
+
+    def __init__(self, url, prefix='superset_session:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        pipe = self.client.pipeline()
+        pipe.get(self.prefix + key)
+        pipe.ttl(self.prefix + key)
+        value, ttl = pipe.execute()
+        if value is None or ttl is None or ttl < 0:
+            return None
+        return value, int(time.time()) + ttl
+
+    def set(self, key, value, expires_at):
+        self.client.set(self.prefix + key, value, exat=expires_at)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class ReadThroughCache:
+    """Small per-worker LRU in front of the shared backend, dropped on delete"""
+
+    def __init__(self, backend, maxsize=10000, ttl=2):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_at, record = entry
+                if now - cached_at < self.ttl and record[1] > time.time():
+                    self._entries.move_to_end(key)
+                    return record
+                del self._entries[key]
+        record = self.backend.get(key)
+        if record is not None:
+            self._remember(key, record)
+        return record
+
+    def set(self, key, value, expires_at):
+        self.backend.set(key, value, expires_at)
+        self._remember(key, (value, expires_at))
+
+    def delete(self, key):
+        # Forget the local copy first, even if the backend call fails
+        with self._lock:
+            self._entries.pop(key, None)
+        self.backend.delete(key)
+
+    def _remember(self, key, record):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its ID and the payload it was loaded from"""
+
+    def __init__(self, initial=None, sid=None, new=False, loaded_payload=None, expires_at=0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.loaded_payload = loaded_payload
+        self.expires_at = expires_at
+        self.previous_sid = None
+        self.modified = False
+        self.accessed = False
+        # Set by read-only endpoints (session_monitor.py): never save or extend
+        self.no_touch = False
+
+    def regenerate(self):
+        """Issue a fresh session ID (call after login to prevent session fixation)"""
+        if self.sid and not self.new:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.new = True
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface storing session data server-side.
+
+    The cookie holds only a signed random session ID. Records are written only
+    when the serialized session content changed, or when the session is past
+    half of its lifetime and its expiry needs to be pushed out.
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+    salt = 'superset-server-side-session'
+    # Requests that never need the session: no store lookup, no cookie
+    skip_paths = ('/static/',)
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie or request.path.startswith(self.skip_paths):
+            return self.session_class(new=True)
+        try:
+            sid = self._signer(app).unsign(cookie).decode('ascii')
+        except (BadSignature, UnicodeDecodeError):
+            return self.session_class(new=True)
+        try:
+            record = self.store.get(sid)
+        except Exception as e:
+            logger.error("❌ Could not load server-side session: %s", e)
+            record = None
+        if record is None:
+            return self.session_class(new=True)
+        payload, expires_at = record
+        try:
+            data = self.serializer.loads(payload.decode('utf-8'))
+        except Exception:
+            return self.session_class(new=True)
+        return self.session_class(data, sid=sid, loaded_payload=payload, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.no_touch:
+            return
+
+        if session.previous_sid:
+            self._delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.sid and not session.new:
+                self._delete(session.sid)
+            if session.modified or session.sid:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        payload = self.serializer.dumps(dict(session)).encode('utf-8')
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        now = int(time.time())
+        changed = payload != session.loaded_payload
+        stale = session.expires_at - now < lifetime // 2
+
+        if session.new or not session.sid:
+            session.sid = secrets.token_urlsafe(32)
+        elif not changed and not stale:
+            return
+
+        try:
+            self.store.set(session.sid, payload, now + lifetime)
+        except Exception as e:
+            # A store outage must not turn every response into a 500
+            logger.error("❌ Could not save server-side session: %s", e)
+            return
+        session.expires_at = now + lifetime
+        session.loaded_payload = payload
+
+        if session.new or stale:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+            session.new = False
+
+
+    def _delete(self, sid):
+        try:
+            self.store.delete(sid)
+        except Exception as e:
+            logger.error("❌ Could not delete server-side session: %s", e)
+
+
+def init_server_side_sessions(app, backend=None):
+    """Install the server-side session interface on the Flask app"""
+    backend_type = os.environ.get('SESSION_STORE_BACKEND', 'mysql').lower()
+    if backend is not None:
+        backend_type = type(backend).__name__
+    elif backend_type == 'redis':
+        url = os.environ.get('SESSION_STORE_REDIS_URL') or os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+        backend = RedisSessionBackend(url)
+    else:
+        backend = MySQLSessionBackend()
+
+    store = ReadThroughCache(
+        backend,
+        maxsize=int(os.environ.get('SESSION_STORE_LOCAL_CACHE_SIZE', '10000')),
+        ttl=float(os.environ.get('SESSION_STORE_LOCAL_CACHE_TTL', '2')),
+    )
+    app.session_interface = ServerSideSessionInterface(store)
+    logger.info("🔧 Server-side sessions enabled (backend: %s)", backend_type)
+    return app.session_interface
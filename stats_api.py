@@ -0,0 +1,50 @@
+"""
+Admin-only JSON stats for the per-worker caches and connection pools
+GET /api/v1/stats/cache/, /api/v1/stats/pool/ and /api/v1/stats/clickhouse/
+report the answering worker's tiered-cache hit rates, metadata DB pool usage
+and ClickHouse HTTP pool usage. They include internal hostnames and traffic
+counters, so they need the can_read permission on OpsStats (Admin by default)
+"""
+import logging
+
+from flask_appbuilder.api import BaseApi, expose, protect, safe
+
+logger = logging.getLogger(__name__)
+
+
+class OpsStatsApi(BaseApi):
+    """Per-worker cache and pool counters"""
+
+    route_base = '/api/v1/stats'
+    class_permission_name = 'OpsStats'
+    method_permission_name = {'cache': 'read', 'pool': 'read', 'clickhouse': 'read'}
+    allow_browser_login = True
+    openapi_spec_tag = 'Stats'
+
+    @expose('/cache/', methods=('GET',))
+    @protect()
+    @safe
+    def cache(self):
+        """Hit/miss counters of the tiered caches (cache_config.py)"""
+        from cache_config import cache_stats
+        return self.response(200, result=cache_stats())
+
+    @expose('/pool/', methods=('GET',))
+    @protect()
+    @safe
+    def pool(self):
+        """Metadata DB pool checkout wait, usage, overflow and invalidations (db_pool.py)"""
+        from db_pool import pool_stats
+        return self.response(200, result=pool_stats())
+
+    @expose('/clickhouse/', methods=('GET',))
+    @protect()
+    @safe
+    def clickhouse(self):
+        """ClickHouse HTTP pool usage and transfer totals (clickhouse_pool.py)"""
+        from clickhouse_pool import clickhouse_stats
+        return self.response(200, result=clickhouse_stats())
+
+
+def init_stats_api(appbuilder):
+    appbuilder.add_api(OpsStatsApi)
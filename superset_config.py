@@ -9,12 +9,9 @@ if ENABLE_SAML_AUTH:
     # Enable SAML authentication with database fallback
     CUSTOM_SECURITY_MANAGER = SamlSecurityManager
     
-    # Add custom template directory
-    import jinja2
-    FAB_TEMPLATE_LOADER = jinja2.ChoiceLoader([
-        jinja2.FileSystemLoader('/app/pythonpath/templates'),
-        jinja2.FileSystemLoader('/app/superset/templates')
-    ])
+    # Add custom template directory (one loader over resolved, deduplicated paths)
+    from template_cache import build_template_loader
+    FAB_TEMPLATE_LOADER = build_template_loader('/app/superset/templates')
 
 AUTH_TYPE = 1  # AUTH_DB (allows both database and SAML auth)
 AUTH_USER_REGISTRATION = True
@@ -24,6 +21,11 @@ SAML_DEFAULT_ROLE = os.environ.get('SAML_DEFAULT_ROLE', 'Gamma')
 AUTH_USER_REGISTRATION_ROLE = SAML_DEFAULT_ROLE
 
 # Allow both SAML and database authentication
+# Keys are the exact claim values the IdP sends (SAML_GROUP_ATTRIBUTES), not Superset role
+# names: Azure AD's groups claim carries group object IDs, e.g.
+#     "3f2a9c1e-0000-0000-0000-000000000000": ["Alpha"],
+# while app role assignments (the role claim) carry the app role value, which the keys
+# below expect. Logins whose claims match no key keep their current roles (saml_provisioning.py)
 AUTH_ROLES_SYNC_AT_LOGIN = True  # Sync roles at login
 AUTH_ROLES_MAPPING = {
     "Gamma": ["Gamma"],
@@ -33,69 +35,186 @@ AUTH_ROLES_MAPPING = {
 
 # Security settings
 TALISMAN_ENABLED = False
-WTF_CSRF_ENABLED = False
+WTF_CSRF_ENABLED = os.environ.get('WTF_CSRF_ENABLED', 'false').lower() == 'true'
 HTTP_HEADERS = {"X-Frame-Options": "ALLOWALL"}
 
 # Custom logout handling - Add JavaScript to handle multi-tab logout coordination
 EXTRA_CATEGORICAL_COLOR_SCHEMES = []
 
-# Add global JavaScript for logout coordination
-GLOBAL_ASYNC_QUERIES_ENABLED = True
-
-# Custom cache settings to prevent authentication caching issues
-SEND_FILE_MAX_AGE_DEFAULT = 60  # Cache static files for 1 minute only
+# HTTP caching - content-hashed static bundles are immutable for a year, login/logout/ACS
+# responses are never stored (http_cache.py); other static files revalidate after 1 minute
+SEND_FILE_MAX_AGE_DEFAULT = 60
 PERMANENT_SESSION_LIFETIME = 3600  # 1 hour session lifetime
 
-# Add no-cache headers for authenticated pages
-def add_no_cache_headers(response):
-    """Add no-cache headers to prevent authentication caching issues"""
-    if hasattr(response, 'headers'):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache' 
-        response.headers['Expires'] = '0'
-    return response
+# Multi-tier caching - per-worker LRU (L1) in front of a shared Redis-compatible store (L2)
+# Without CACHE_REDIS_URL the L2 is an in-process SimpleCache (local/test stand-in)
+from cache_config import CACHE_REDIS_URL, build_cache_config
+
+CACHE_CONFIG = build_cache_config('cache', 'CACHE', 'superset_', 86400)
+DATA_CACHE_CONFIG = build_cache_config('data', 'DATA_CACHE', 'superset_data_', 86400, l1_max_entries=128)
+THUMBNAIL_CACHE_CONFIG = build_cache_config('thumbnail', 'THUMBNAIL_CACHE', 'superset_thumbnail_', 86400)
+if CACHE_REDIS_URL:
+    # Mutable per-user state: no L1 so every replica sees updates immediately.
+    # Without Redis, Superset keeps these in the metadata database.
+    FILTER_STATE_CACHE_CONFIG = build_cache_config('filter_state', 'FILTER_STATE_CACHE', 'superset_filter_state_', 86400, l1_ttl=0)
+    EXPLORE_FORM_DATA_CACHE_CONFIG = build_cache_config('explore_form_data', 'EXPLORE_FORM_DATA_CACHE', 'superset_explore_form_data_', 86400, l1_ttl=0)
+
+# Server-side sessions - the cookie only carries an opaque session ID
+# Backend: mysql (metadata database, default) or redis (SESSION_STORE_REDIS_URL)
+SERVER_SIDE_SESSIONS_ENABLED = os.environ.get('SERVER_SIDE_SESSIONS_ENABLED', 'true').lower() == 'true'
+
+def FLASK_APP_MUTATOR(app):
+    """Hook custom extensions into the Superset Flask app"""
+    setup_jinja_globals(app)
+    
+    # Probes/metrics, template cache, HTTP cache policy, session TTL and server-side sessions
+    # (shared with benchmarks/bench_auth.py)
+    from app_hooks import init_request_hooks
+    init_request_hooks(app, server_side_sessions=SERVER_SIDE_SESSIONS_ENABLED)
+    
+    from superset.extensions import appbuilder
+    
+    # Admin-only per-worker stats: /api/v1/stats/cache/, /api/v1/stats/pool/, /api/v1/stats/clickhouse/
+    from stats_api import init_stats_api
+    init_stats_api(appbuilder)
+    
+    # POST /api/v1/security/guest_token/batch/ - cached guest tokens for many embedded dashboards
+    from guest_tokens import init_guest_token_api
+    init_guest_token_api(appbuilder)
+    
+    # `superset saml-provision-users` - bulk user pre-provisioning from IdP exports
+    from provision_users import provision_users_command
+    app.cli.add_command(provision_users_command)
+
+    # `superset cache-warmup` - warm the data cache for the most-viewed charts (logs table)
+    from cache_warmup import cache_warmup_command
+    app.cli.add_command(cache_warmup_command)
 
 # Custom Jinja2 global functions
 def setup_jinja_globals(app):
     """Setup custom Jinja2 global functions"""
     @app.template_global()
     def logout_script():
-        """Generate logout coordination script"""
+        """Generate logout coordination and session expiry script"""
         return """
 <script>
 (function() {
+    // One leader tab asks /session/ttl/ when the session is due to expire and
+    // shares the result; other tabs only listen. No fixed-interval polling.
+    var TTL_URL = '/session/ttl/';
+    var MAX_DELAY = 2147483647;  // setTimeout limit
+    var channel = typeof BroadcastChannel !== 'undefined' ? new BroadcastChannel('superset-logout') : null;
+    var timer = null;
+
+    function goToLogin() {
+        window.location.href = '/login/';
+    }
+
+    function broadcastLogout() {
+        if (channel) {
+            channel.postMessage({type: 'LOGOUT', timestamp: Date.now()});
+        }
+        localStorage.setItem('superset-logout-event', Date.now().toString());
+    }
+
     // Handle logout coordination between tabs
-    if (typeof BroadcastChannel !== 'undefined') {
-        const channel = new BroadcastChannel('superset-logout');
+    if (channel) {
         channel.addEventListener('message', function(event) {
             if (event.data.type === 'LOGOUT') {
-                window.location.href = '/login/';
+                goToLogin();
             }
         });
     }
-    
+
     // Fallback: localStorage listener
     window.addEventListener('storage', function(e) {
         if (e.key === 'superset-logout-event') {
-            window.location.href = '/login/';
+            goToLogin();
         }
     });
-    
-    // Handle session expiry
-    setInterval(function() {
-        fetch('/api/v1/security/current_user/', {
-            credentials: 'include',
+
+    // Leader only: check the remaining TTL and sleep until the session should expire
+    function checkSession() {
+        clearTimeout(timer);
+        fetch(TTL_URL, {
+            credentials: 'same-origin',
             headers: {'X-Requested-With': 'XMLHttpRequest'}
         }).then(function(response) {
             if (response.status === 401 || response.status === 403) {
-                // Session expired or forbidden
-                window.location.href = '/login/';
+                broadcastLogout();
+                goToLogin();
+                return null;
+            }
+            return response.json();
+        }).then(function(data) {
+            // ttl is null for signed cookie sessions: the expiry is unknown server-side,
+            // so only re-check when the tab is shown again
+            if (!data || data.ttl === null) {
+                return;
             }
+            // Activity in any tab may have extended the session, so re-check at expiry
+            var delay = Math.min(MAX_DELAY, (data.ttl + 1) * 1000);
+            timer = setTimeout(checkSession, delay);
         }).catch(function() {
-            // Network error or other issues - check if we're still authenticated
-            // Don't redirect immediately, but check again later
+            // Network error - try again in a minute without logging out
+            timer = setTimeout(checkSession, 60000);
         });
-    }, 30000); // Check every 30 seconds
+    }
+
+    function lead() {
+        checkSession();
+        // Timers are throttled in background tabs, re-check when the leader is shown again
+        document.addEventListener('visibilitychange', function() {
+            if (document.visibilityState === 'visible') {
+                checkSession();
+            }
+        });
+    }
+
+    // Leader election: Web Locks when available (released automatically when the
+    // tab closes), otherwise the first tab to claim leadership over the channel
+    if (navigator.locks && navigator.locks.request) {
+        navigator.locks.request('superset-session-monitor', function() {
+            lead();
+            return new Promise(function() {});  // hold the lock for the tab lifetime
+        });
+    } else if (channel) {
+        var tabId = Math.random().toString(36).slice(2);
+        var leaderSeen = false;
+        var isLeader = false;
+        channel.addEventListener('message', function(event) {
+            var data = event.data;
+            if (data.type === 'LEADER_QUERY' && isLeader) {
+                channel.postMessage({type: 'LEADER', id: tabId});
+            } else if (data.type === 'LEADER' && data.id !== tabId) {
+                leaderSeen = true;
+            } else if (data.type === 'LEADER_GONE') {
+                leaderSeen = false;
+                setTimeout(electLeader, Math.random() * 500);
+            }
+        });
+        window.addEventListener('beforeunload', function() {
+            if (isLeader) {
+                channel.postMessage({type: 'LEADER_GONE', id: tabId});
+            }
+        });
+        var electLeader = function() {
+            if (isLeader) {
+                return;
+            }
+            channel.postMessage({type: 'LEADER_QUERY', id: tabId});
+            setTimeout(function() {
+                if (!leaderSeen && !isLeader) {
+                    isLeader = true;
+                    channel.postMessage({type: 'LEADER', id: tabId});
+                    lead();
+                }
+            }, 300);
+        };
+        electLeader();
+    } else {
+        lead();
+    }
 })();
 </script>
         """.strip()
@@ -114,6 +233,15 @@ HTML_SANITIZATION_SCHEMA_EXTENSIONS = {
     "tagNames": ["style"],
 }
 
+# StatsD metrics (Superset's own plus the SAML login phases from saml_metrics.py)
+if os.environ.get('STATSD_HOST'):
+    from superset.stats_logger import StatsdStatsLogger
+    STATS_LOGGER = StatsdStatsLogger(
+        host=os.environ['STATSD_HOST'],
+        port=int(os.environ.get('STATSD_PORT', '8125')),
+        prefix=os.environ.get('STATSD_PREFIX', 'superset')
+    )
+
 # Database configuration - read from environment
 # MySQL is REQUIRED - fail fast if not configured properly
 SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or os.environ.get('SQLALCHEMY_DATABASE_URI')
@@ -131,8 +259,93 @@ if not SECRET_KEY:
 
 # MySQL-specific engine options
 if 'mysql' in SQLALCHEMY_DATABASE_URI:
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'echo': False
-    }
\ No newline at end of file
+    # Pool sized from SERVER_THREADS_AMOUNT or SQLALCHEMY_POOL_* env, see db_pool.py
+    from db_pool import build_engine_options
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options()
+
+# ClickHouse data sources: shared per-worker HTTP pool, transport compression and
+# per-source/per-role query settings for clickhousedb engines, see clickhouse_pool.py
+from clickhouse_pool import configure_client_defaults, mutate_connection
+configure_client_defaults()
+
+def DB_CONNECTION_MUTATOR(uri, params, username, security_manager, source):
+    return mutate_connection(uri, params, username, security_manager, source)
+
+# Celery - SQL Lab, async chart queries, thumbnails and reports run on worker pods
+# (SUPERSET_ROLE=worker / beat in entrypoint.sh). Only configured when CELERY_BROKER_URL
+# is set explicitly: a cache Redis alone does not mean any worker is running
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', '')
+
+if CELERY_BROKER_URL:
+    import hashlib
+    from urllib.parse import urlparse
+    from celery.schedules import crontab
+
+    class CeleryConfig:
+        broker_url = CELERY_BROKER_URL
+        result_backend = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+        imports = (
+            "superset.sql_lab",
+            "superset.tasks.scheduler",
+            "superset.tasks.thumbnails",
+            "superset.tasks.cache",
+            "superset.tasks.async_queries",
+        )
+        # Long ClickHouse queries: hand out one task at a time per process
+        worker_prefetch_multiplier = int(os.environ.get('CELERY_PREFETCH_MULTIPLIER', '1'))
+        worker_concurrency = int(os.environ.get('CELERY_WORKER_CONCURRENCY', '4'))
+        worker_max_tasks_per_child = int(os.environ.get('CELERY_MAX_TASKS_PER_CHILD', '128'))
+        task_acks_late = os.environ.get('CELERY_TASK_ACKS_LATE', 'true').lower() == 'true'
+        result_expires = int(os.environ.get('CELERY_RESULT_EXPIRES', '86400'))
+        task_annotations = {
+            "sql_lab.get_sql_results": {"rate_limit": os.environ.get('CELERY_SQLLAB_RATE_LIMIT', '100/s')},
+        }
+        beat_schedule = {
+            "reports.scheduler": {
+                "task": "reports.scheduler",
+                "schedule": crontab(minute="*", hour="*"),
+            },
+            "reports.prune_log": {
+                "task": "reports.prune_log",
+                "schedule": crontab(minute=0, hour=0),
+            },
+        }
+
+    CELERY_CONFIG = CeleryConfig
+
+    # SQL Lab results are written by workers and read back by the web pods:
+    # Redis (default), or with RESULTS_BACKEND_TYPE=filesystem compressed msgpack/Arrow
+    # payloads on a volume shared by all pods (RESULTS_BACKEND_DIR) with size-based eviction
+    from results_backend import build_results_backend
+    RESULTS_BACKEND = build_results_backend(CELERY_BROKER_URL)
+    RESULTS_BACKEND_USE_MSGPACK = True
+
+    # Async chart queries: the browser polls (or listens over websockets) for results
+    # that workers put into CACHE_CONFIG/DATA_CACHE_CONFIG. Those are shared whenever a
+    # broker is set: cache_config.CACHE_REDIS_URL falls back to CELERY_BROKER_URL.
+    # Opt-in, since queued queries never complete without a running worker
+    GLOBAL_ASYNC_QUERIES_ENABLED = os.environ.get('GLOBAL_ASYNC_QUERIES_ENABLED', 'false').lower() == 'true'
+    FEATURE_FLAGS["GLOBAL_ASYNC_QUERIES"] = GLOBAL_ASYNC_QUERIES_ENABLED
+    GLOBAL_ASYNC_QUERIES_TRANSPORT = os.environ.get('GLOBAL_ASYNC_QUERIES_TRANSPORT', 'polling')
+    GLOBAL_ASYNC_QUERIES_POLLING_DELAY = int(os.environ.get('GLOBAL_ASYNC_QUERIES_POLLING_DELAY', '500'))
+    GLOBAL_ASYNC_QUERIES_WEBSOCKET_URL = os.environ.get('GLOBAL_ASYNC_QUERIES_WEBSOCKET_URL', 'ws://127.0.0.1:8080/')
+    # Must be at least 32 bytes and identical on every pod; derived from SECRET_KEY if not set
+    GLOBAL_ASYNC_QUERIES_JWT_SECRET = (
+        os.environ.get('GLOBAL_ASYNC_QUERIES_JWT_SECRET')
+        or hashlib.sha256(f'async-queries:{SECRET_KEY}'.encode()).hexdigest()
+    )
+    GLOBAL_ASYNC_QUERIES_JWT_COOKIE_SECURE = os.environ.get('GLOBAL_ASYNC_QUERIES_JWT_COOKIE_SECURE', 'false').lower() == 'true'
+    _async_redis = urlparse(os.environ.get('GLOBAL_ASYNC_QUERIES_REDIS_URL', CELERY_BROKER_URL))
+    GLOBAL_ASYNC_QUERIES_CACHE_BACKEND = {
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_REDIS_HOST": _async_redis.hostname or 'localhost',
+        "CACHE_REDIS_PORT": _async_redis.port or 6379,
+        "CACHE_REDIS_USER": _async_redis.username or '',
+        "CACHE_REDIS_PASSWORD": _async_redis.password or '',
+        "CACHE_REDIS_DB": int((_async_redis.path or '/0').lstrip('/') or 0),
+        "CACHE_REDIS_SSL": _async_redis.scheme == 'rediss',
+        "CACHE_DEFAULT_TIMEOUT": 300,
+    }
+else:
+    # Without a broker queries keep running synchronously in the web process
+    GLOBAL_ASYNC_QUERIES_ENABLED = False
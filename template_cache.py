@@ -0,0 +1,141 @@
+"""
+Jinja template loading and bytecode cache for the custom login/logout templates
+Resolves and deduplicates the template search path once, and stores compiled
+templates in a FileSystemBytecodeCache that the image build pre-populates, so
+the first login render after a pod start skips parsing and compiling
+
+Compiled bytecode depends on the Jinja environment (autoescape, extensions,
+delimiters), so the cache is split into one directory per environment
+fingerprint; a runtime environment that differs from the build-time one just
+compiles into its own directory instead of using mismatched bytecode
+
+Usage (image build):
+    python template_cache.py    # precompile into JINJA_BYTECODE_CACHE_DIR
+"""
+import os
+import sys
+import hashlib
+import logging
+
+import jinja2
+
+logger = logging.getLogger(__name__)
+
+CUSTOM_TEMPLATE_DIR = '/app/pythonpath/templates'
+JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', '/app/jinja_bytecode')
+# Flask-Babel adds the i18n extension to the Flask environment, mirror it at build time
+JINJA_PRECOMPILE_EXTENSIONS = [
+    ext.strip() for ext in
+    os.environ.get('JINJA_PRECOMPILE_EXTENSIONS', 'jinja2.ext.i18n').split(',')
+    if ext.strip()
+]
+
+
+def resolve_search_path(paths):
+    """Existing directories as real paths, first occurrence wins"""
+    resolved = []
+    for path in paths:
+        real = os.path.realpath(path)
+        if os.path.isdir(real) and real not in resolved:
+            resolved.append(real)
+    return resolved
+
+
+def build_template_loader(*extra_dirs):
+    """One FileSystemLoader over the custom templates and ``extra_dirs``"""
+    return jinja2.FileSystemLoader(resolve_search_path((CUSTOM_TEMPLATE_DIR,) + extra_dirs))
+
+
+def install_template_loader(app):
+    """Put the custom templates first in the app loader's search path, once"""
+    loader = app.jinja_loader
+    if isinstance(loader, jinja2.FileSystemLoader):
+        loader.searchpath = resolve_search_path([CUSTOM_TEMPLATE_DIR] + list(loader.searchpath))
+
+
+def environment_fingerprint(env):
+    """Hash of the environment settings that change the generated code"""
+    parts = (
+        jinja2.__version__,
+        sorted(env.extensions),
+        env.block_start_string, env.block_end_string,
+        env.variable_start_string, env.variable_end_string,
+        env.comment_start_string, env.comment_end_string,
+        env.line_statement_prefix, env.line_comment_prefix,
+        env.trim_blocks, env.lstrip_blocks, env.newline_sequence,
+        env.keep_trailing_newline, env.optimized,
+        # autoescape is usually a function of the file name
+        tuple(
+            bool(env.autoescape(name) if callable(env.autoescape) else env.autoescape)
+            for name in ('x.html', 'x.txt', None)
+        ),
+    )
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def bytecode_cache_for(env):
+    directory = os.path.join(JINJA_BYTECODE_CACHE_DIR, environment_fingerprint(env))
+    os.makedirs(directory, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(directory), directory
+
+
+def init_template_cache(app):
+    """Attach the bytecode cache matching the app's Jinja environment"""
+    env = app.jinja_env
+    try:
+        env.bytecode_cache, directory = bytecode_cache_for(env)
+    except OSError as e:
+        logger.warning("⚠️ Jinja bytecode cache disabled: %s", e)
+        return
+    if any(name.endswith('.cache') for name in os.listdir(directory)):
+        logger.info("✅ Using precompiled Jinja templates from %s", directory)
+    else:
+        logger.info("ℹ️ No precompiled Jinja templates for this environment, compiling on first use into %s", directory)
+
+
+def template_dirs():
+    """
+    Directories precompiled at build time, as the runtime loaders see them:
+    the custom templates (app loader) and Flask-AppBuilder's (blueprint loader)
+    """
+    dirs = resolve_search_path([CUSTOM_TEMPLATE_DIR])
+    try:
+        import flask_appbuilder
+    except ImportError:
+        return dirs
+    # Not resolved: the cache key contains the path exactly as the blueprint builds it
+    fab_dir = os.path.join(os.path.dirname(flask_appbuilder.__file__), 'templates')
+    if os.path.isdir(fab_dir):
+        dirs.append(fab_dir)
+    return dirs
+
+
+def precompile():
+    """Compile every template into the bytecode cache with a Flask-equivalent environment"""
+    from flask import Flask
+
+    app = Flask('template_cache')
+    env = app.create_jinja_environment()
+    for extension in JINJA_PRECOMPILE_EXTENSIONS:
+        env.add_extension(extension)
+    env.bytecode_cache, directory = bytecode_cache_for(env)
+
+    compiled, failed = 0, 0
+    for search_dir in template_dirs():
+        env.loader = jinja2.FileSystemLoader(search_dir)
+        env.cache.clear()
+        for name in env.loader.list_templates():
+            if not name.endswith(('.html', '.htm', '.xml', '.txt', '.js')):
+                continue
+            try:
+                env.get_template(name)
+                compiled += 1
+            except jinja2.TemplateError as e:
+                failed += 1
+                print(f"⚠️  Skipped {name}: {e}")
+    print(f"✅ Precompiled {compiled} templates into {directory} ({failed} skipped)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(precompile())
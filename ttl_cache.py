@@ -0,0 +1,48 @@
+"""
+Small per-worker cache with per-entry expiry
+Used for SAML provisioning lookups (saml_provisioning.py) and resolved
+embedded dashboards (guest_tokens.py)
+"""
+import time
+import threading
+
+
+class TTLCache:
+    """Thread-safe dict with per-entry expiry and a size bound"""
+
+    def __init__(self, ttl, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                for stale in [k for k, v in self._entries.items() if v[0] < now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.maxsize:
+                    # Still full, drop the oldest insertion
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()